@@ -0,0 +1,92 @@
+"""
+Draw and savefig time of fishbowl.draw functions against the number of points.
+
+Run with pytest-benchmark, e.g. ``py.test benchmarks``.
+"""
+import io
+import pytest
+import numpy as np
+
+pytest.importorskip('pytest_benchmark')
+
+import matplotlib  # noqa: E402
+matplotlib.use('agg')
+
+import fishbowl.draw  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+
+
+def line_figure(n, fast):
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    x = np.linspace(0, 100, n)
+    y = np.sin(x) + np.random.rand(n)
+    fishbowl.draw.line(x, y, yerr=0.1 * np.ones(n), fast=fast, ax=ax)
+    return fig
+
+
+@pytest.mark.parametrize('fast', [False, True])
+@pytest.mark.parametrize('n', [10**3, 10**4, 10**5])
+def test_line_draw(benchmark, n, fast):
+    fig = line_figure(n, fast)
+    benchmark(fig.canvas.draw)
+
+
+@pytest.mark.parametrize('fast', [False, True])
+@pytest.mark.parametrize('n', [10**3, 10**4, 10**5])
+def test_line_savefig(benchmark, n, fast):
+    fig = line_figure(n, fast)
+    benchmark(fig.savefig, io.BytesIO(), format='png')
+
+
+def bar_figure(n):
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    labels = ['bar' + str(i) for i in range(n)]
+    fishbowl.draw.bar(labels, np.random.rand(n), ax=ax)
+    return fig
+
+
+@pytest.mark.parametrize('n', [10, 10**2, 10**3, 10**4])
+def test_bar(benchmark, n):
+    benchmark(lambda: bar_figure(n).canvas.draw())
+
+
+@pytest.mark.parametrize('rows', [10, 100])
+def test_box_palette(benchmark, rows):
+    import matplotlib.pyplot as plt
+    import fishbowl.color
+
+    colors = [fishbowl.color.palette('goldfish@24')['color.palette']] * rows
+
+    def draw():
+        fishbowl.color.draw_box_palette(colors)
+        plt.gcf().canvas.draw()
+        plt.close('all')
+    benchmark(draw)
+
+
+@pytest.mark.parametrize('rows', [10, 100, 1000])
+def test_palette_sheet(benchmark, rows):
+    import fishbowl.color
+
+    names = ['goldfish:light@' + str(2 + i % 30) for i in range(rows)]
+    benchmark(lambda: fishbowl.color.draw_palette_sheet(names).canvas.draw())
+
+
+@pytest.mark.parametrize('panels', [4, 10])
+def test_facets(benchmark, panels):
+    import matplotlib.pyplot as plt
+    from fishbowl import facet
+
+    def draw():
+        fig, axes = facet.facets(panels, panels, figsize=(2 * panels,) * 2)
+        for ax in axes.flat:
+            ax.plot(np.arange(10))
+        facet.setup_facets(axes, xlabel='x', ylabel='y')
+        fig.canvas.draw()
+        plt.close(fig)
+    benchmark.pedantic(draw, rounds=3)
@@ -0,0 +1,22 @@
+"""
+Import time of fishbowl, each measured in a fresh interpreter.
+
+Run with pytest-benchmark, e.g. ``py.test benchmarks``.
+"""
+import sys
+import pytest
+import subprocess
+
+pytest.importorskip('pytest_benchmark')
+
+
+def run(code):
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+@pytest.mark.parametrize('code', ['pass',
+                                  'import fishbowl',
+                                  'import fishbowl; fishbowl.plot',
+                                  'import fishbowl; fishbowl.set_style()'])
+def test_import(benchmark, code):
+    benchmark.pedantic(run, args=(code,), rounds=5, iterations=1)
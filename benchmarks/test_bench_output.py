@@ -0,0 +1,36 @@
+"""
+Time to save a typical figure in each output format.
+
+Run with pytest-benchmark, e.g. ``py.test benchmarks``.
+"""
+import io
+import pytest
+import numpy as np
+
+pytest.importorskip('pytest_benchmark')
+
+import matplotlib  # noqa: E402
+matplotlib.use('agg')
+
+import fishbowl.draw  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def figure():
+    fishbowl.set_style(font='DejaVu Serif')
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    x = np.linspace(0, 10, 200)
+    for i in range(4):
+        fishbowl.draw.line(x, np.sin(x + i), ax=ax, label=str(i))
+    fishbowl.draw.setup_axes(ax, xlabel='x', ylabel='y', title='fishbowl')
+    ax.legend()
+    return fig
+
+
+@pytest.mark.parametrize('fmt', ['png', 'pdf', 'svg'])
+def test_savefig(benchmark, figure, fmt):
+    benchmark(figure.savefig, io.BytesIO(), format=fmt)
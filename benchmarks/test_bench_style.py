@@ -0,0 +1,42 @@
+"""
+Time to switch styles and look up saved configurations.
+
+Run with pytest-benchmark, e.g. ``py.test benchmarks``.
+"""
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import matplotlib  # noqa: E402
+matplotlib.use('agg')
+
+import fishbowl  # noqa: E402
+from fishbowl import axes, color  # noqa: E402
+
+
+def test_set_style(benchmark):
+    benchmark(fishbowl.set_style, palette='gourami', font='DejaVu Serif')
+
+
+def test_style_enter_exit(benchmark):
+    def enter_exit():
+        with fishbowl.style(palette='gourami', font='DejaVu Serif'):
+            pass
+    benchmark(enter_exit)
+
+
+def test_scoped_style_enter_exit(benchmark):
+    def enter_exit():
+        with fishbowl.scoped_style(palette='gourami', font='DejaVu Serif'):
+            pass
+    benchmark(enter_exit)
+
+
+@pytest.mark.parametrize('lookup,name', [(color.palette, 'goldfish'),
+                                         (axes.axes, 'minimal')])
+def test_saved_lookup(benchmark, lookup, name):
+    benchmark(lookup, name)
+
+
+def test_generated_palette(benchmark):
+    benchmark(color.palette, 'goldfish:light@24')
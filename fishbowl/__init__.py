@@ -14,13 +14,70 @@ The easiest way to do this is usually:
 >>> import fishbowl
 >>> import matplotlib.pyplot as plt
 
+Submodules and their functions are imported when first used, so importing
+fishbowl only pays for what the caller uses.
+
 Modules:
 
 core -- Style setup and control tools
+render -- Render many plots in parallel
+pgf -- Faster text layout for the pgf backend
+cache -- Skip rendering plots which have not changed
+profiling -- Time spent in each phase of rendering a plot
+output -- Save one figure to several files
+facet -- Grids of small multiples sharing their axes
 
 """
 __version__ = '0.3.1'
 
-from fishbowl.core import (style, set_style,  # noqa: F401
-                           get_style, reset_style)
-from fishbowl.decorator import plot  # noqa: F401
+import sys
+import importlib
+
+# Public names and the submodule they are loaded from on first access
+_lazy = {'style': 'core',
+         'set_style': 'core',
+         'get_style': 'core',
+         'reset_style': 'core',
+         'compile_style': 'core',
+         'scoped_style': 'core',
+         'push_style': 'core',
+         'pop_style': 'core',
+         'plot': 'decorator',
+         'render_many': 'render',
+         'save_async': 'output',
+         'facets': 'facet'}
+
+_submodules = ('axes', 'base', 'cache', 'color', 'core', 'decimate',
+               'decorator', 'draw', 'facet', 'font', 'output', 'pgf',
+               'profiling', 'render')
+
+
+def __getattr__(name):
+    """ Import submodules and their functions when first used.
+
+    """
+    if name in _lazy:
+        value = getattr(importlib.import_module('fishbowl.' + _lazy[name]),
+                        name)
+    elif name in _submodules:
+        value = importlib.import_module('fishbowl.' + name)
+    else:
+        raise AttributeError("module 'fishbowl' has no attribute "
+                             + repr(name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy) | set(_submodules))
+
+
+# Module __getattr__ is only supported from python 3.7
+if sys.version_info < (3, 7):
+    from fishbowl.core import (style, set_style,  # noqa: F401
+                               get_style, reset_style, compile_style,
+                               scoped_style, push_style, pop_style)
+    from fishbowl.decorator import plot  # noqa: F401
+    from fishbowl.render import render_many  # noqa: F401
+    from fishbowl.output import save_async  # noqa: F401
+    from fishbowl.facet import facets  # noqa: F401
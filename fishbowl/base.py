@@ -1,12 +1,129 @@
 """
 base - Utilities for saving/loading configurations.
+
+Saved configurations are read through a shared in-process cache, keyed by
+the resolved path of the json file and invalidated when the file's mtime or
+size changes. Use clear_cache() to drop everything that has been loaded.
+Cached values are read-only and shared, loads hand out a plain copy of
+their top level.
+
+Saves replace the json file atomically while holding an advisory lock, so
+concurrent writers do not lose updates or leave a partially written file.
+Use batch_save() to combine many saves into a single write, and locked() with
+write_json() to save other json files the same way.
+
+Also holds small internals shared by modules which must stay cheap to import.
 """
 
 import os
 import json
+import tempfile
+import threading
 
+from contextlib import contextmanager
 from functools import wraps
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    ContextVar = None
+
+
+class _LocalVar(object):
+    """ Thread local stand-in for ContextVar on older pythons.
+
+    """
+
+    def __init__(self, name, default=None):
+        self._local = threading.local()
+        self._default = default
+
+    def get(self):
+        return getattr(self._local, 'value', self._default)
+
+    def set(self, value):
+        token = self.get()
+        self._local.value = value
+        return token
+
+    def reset(self, token):
+        self._local.value = token
+
+
+def _context_var(name):
+    """ ContextVar, or a thread local stand-in, defaulting to None.
+
+    """
+    if ContextVar is not None:
+        return ContextVar(name, default=None)
+    return _LocalVar(name)
+
+
+class _ReadOnlyDict(dict):
+    """ Dictionary of saved values shared by all loads.
+
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Saved configurations are shared, '
+                        'copy with dict() before modifying')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        import copy
+        return dict((key, copy.deepcopy(value, memo))
+                    for key, value in self.items())
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def _freeze(value):
+    """ Read-only copy of json values, lists become tuples.
+
+    """
+    if isinstance(value, dict):
+        return _ReadOnlyDict((key, _freeze(item))
+                             for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    """ Plain copy of the top level of a frozen value.
+
+    Dictionaries and tuples directly inside a dictionary are copied too, so
+    configurations can be modified like the json they were read from.
+    """
+    if isinstance(value, dict):
+        return dict((key, _thaw(item) if isinstance(item, tuple)
+                     else dict(item) if isinstance(item, dict) else item)
+                    for key, item in value.items())
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+# Parsed json files, {realpath: ((mtime, size), read-only values)}
+_cache = {}
+
+# Saves collected by an active batch_save in this thread
+_batch = threading.local()
+
+# os.rename does not replace existing files on windows
+_replace = getattr(os, 'replace', os.rename)
+
 
 def _config_path(path):
     """ Absolute path to file in configuration directory for module.
@@ -18,30 +135,173 @@ def _config_path(path):
                                          path))
 
 
+def _signature(path):
+    """ Signature used to decide if a cached file is still valid.
+
+    Returns None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+def _load_json(path):
+    """ Saved values from the json file at path, read through the cache.
+
+    The returned dictionary is shared and read-only.
+    """
+    signature = _signature(path)
+    if signature is None:
+        _cache.pop(path, None)
+        return {}
+
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(path, 'r') as infile:
+        saved_values = _freeze(json.load(infile))
+    _cache[path] = (signature, saved_values)
+    return saved_values
+
+
+def _pending(path):
+    """ Values saved to path within the active batch, if any.
+
+    """
+    pending = getattr(_batch, 'pending', None)
+    if pending is None:
+        return {}
+    return pending.get(path, {})
+
+
+def _lookup(path, key):
+    """ Value saved for key at path, raises KeyError if there is none.
+
+    """
+    pending = _pending(path)
+    if key in pending:
+        return pending[key]
+    return _load_json(path)[key]
+
+
+@contextmanager
+def locked(path):
+    """ Hold an advisory lock on path while writing it.
+
+    The lock is taken on a separate file because the json file itself is
+    replaced on every write. Without fcntl this only runs the body.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lockfile:
+        fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+
+
+def write_json(path, values):
+    """ Atomically replace the json file at path with values.
+
+    """
+    directory, name = os.path.split(path)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    fd, temp = tempfile.mkstemp(dir=directory, prefix='.' + name,
+                                suffix='.tmp')
+    try:
+        os.chmod(temp, mode)
+        with os.fdopen(fd, 'w') as outfile:
+            json.dump(values, outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        _replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def _update_json(path, updates):
+    """ Add updates to the values saved at path in one read-modify-write.
+
+    """
+    with locked(path):
+        # Read the file directly, another process may have just written it
+        if os.path.exists(path):
+            with open(path, 'r') as infile:
+                saved_values = json.load(infile)
+        else:
+            saved_values = {}
+        saved_values.update(updates)
+        write_json(path, saved_values)
+        _cache[path] = (_signature(path), _freeze(saved_values))
+
+
+@contextmanager
+def batch_save():
+    """ Context manager to combine saves into one write per file.
+
+    Values saved within the context are visible to loads in the same thread
+    and are written to disk when the context exits. Nothing is written if the
+    body raises. Nested batches are merged into the outermost one.
+    """
+    if getattr(_batch, 'pending', None) is not None:
+        yield
+        return
+    _batch.pending = {}
+    try:
+        yield
+        pending, _batch.pending = _batch.pending, None
+        for path, updates in pending.items():
+            _update_json(path, updates)
+    finally:
+        _batch.pending = None
+
+
+def clear_cache():
+    """ Drop all cached configurations.
+
+    The next lookup of any saved configuration reads it from disk again.
+    """
+    _cache.clear()
+
+
 def loads_from_json(path):
     """ Decorator to make function first return values saved at json path.
 
     Assumes the first argument is the dictionary key if intended to load from
     file. The function is assumed to handle all cases where the key is not
-    found in json.
+    found in json. Saved values are copied from the cache, _saved on the
+    decorated function returns the shared read-only value instead.
     """
     def loads_from_json_dec(func):
         # Assign a json path to the function for reading
         func._json = _config_path(path)
 
-        @wraps(func)
-        def json_load_func(*args, **kwargs):
-            if os.path.exists(func._json) and len(args) == 1:
-                with open(func._json, 'r') as infile:
-                    saved_values = json.load(infile)
-                if args[0] in saved_values:
-                    return saved_values[args[0]]
+        def saved_or_func(*args, **kwargs):
+            if len(args) == 1:
+                try:
+                    return _lookup(func._json, args[0])
+                except (KeyError, TypeError):
+                    pass
             val = func(*args, **kwargs)
             if val:
                 return val
             raise ValueError('Could not interpret argument "'
                              + str(args[0])
                              + '" and no saved value found.')
+
+        @wraps(func)
+        def json_load_func(*args, **kwargs):
+            return _thaw(saved_or_func(*args, **kwargs))
+        json_load_func._saved = saved_or_func
         return json_load_func
     return loads_from_json_dec
 
@@ -60,15 +320,11 @@ def saves_to_json(path):
         def json_save_func(*args, **kwargs):
             value = func(*args, **kwargs)
 
-            if os.path.exists(func._json):
-                with open(func._json, 'r') as infile:
-                    saved_values = json.load(infile)
+            pending = getattr(_batch, 'pending', None)
+            if pending is not None:
+                pending.setdefault(func._json, {})[args[0]] = _freeze(value)
             else:
-                saved_values = {}
-            saved_values[args[0]] = value
-
-            with open(func._json, 'w') as outfile:
-                json.dump(saved_values, outfile)
+                _update_json(func._json, {args[0]: value})
             return value
         return json_save_func
     return saves_to_json_dec
@@ -0,0 +1,232 @@
+"""
+cache - Skip rendering plots which have not changed
+
+A render is identified by a hash of the plot function's source, the options
+it is called with, the active style, the working directory and the contents
+of any declared input files. The manifest records the output written for
+each key, and a plot with the cache enabled returns the recorded output
+without drawing while that file is unchanged on disk and the output names
+still resolve to it.
+
+RenderCache - Manifest of rendered outputs, see fishbowl.plot(cache=...)
+"""
+
+import os
+import json
+import time
+import inspect
+import hashlib
+import sqlite3
+import threading
+
+from collections import namedtuple
+
+CacheEntry = namedtuple('CacheEntry', ['key', 'output', 'created'])
+CacheEntry.__doc__ = """ One render recorded in the manifest
+
+key is the hash of the render's inputs, output the filename, or list of
+filenames, written by the render and created the time it was written.
+"""
+
+# Hashes of input files, {path: ((mtime, size), digest)}
+_file_hashes = {}
+
+# Source of plot functions, {func: source}
+_sources = {}
+
+
+def _hash_file(path):
+    """ Digest of the contents of the file at path.
+
+    Files are read again only if their mtime or size changed, so an input
+    shared by many plots is hashed once.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_mtime, stat.st_size)
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(2**20), b''):
+            digest.update(block)
+    _file_hashes[path] = (signature, digest.hexdigest())
+    return _file_hashes[path][1]
+
+
+def _encode(value):
+    """ Stable json representation for values json does not know.
+
+    """
+    if hasattr(value, 'tobytes') and hasattr(value, 'dtype'):
+        # Arrays are identified by their contents, not their truncated repr
+        return [str(value.dtype), list(getattr(value, 'shape', ())),
+                hashlib.sha1(value.tobytes()).hexdigest()]
+    return repr(value)
+
+
+def _source(func):
+    """ Source of func, or its bytecode if the source is not available.
+
+    """
+    try:
+        return inspect.getsource(func)
+    except (IOError, OSError, TypeError):
+        return repr(getattr(func, '__code__', func))
+
+
+class RenderCache(object):
+    """ Manifest of rendered outputs, keyed by the hash of their inputs.
+
+    The manifest is a sqlite database which may be shared by several
+    processes rendering at once.
+
+    Parameters
+    ----------
+    path : str
+        manifest file, defaults to FISHBOWL_RENDER_CACHE or a file in
+        the matplotlib cache directory
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get('FISHBOWL_RENDER_CACHE')
+        if path is None:
+            import matplotlib
+            path = os.path.join(matplotlib.get_cachedir(),
+                                'fishbowl.renders.sqlite')
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """ Connection to the manifest, opened again in forked processes.
+
+        """
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            # files holds [path, mtime, size] of each file written, as json
+            db.execute('CREATE TABLE IF NOT EXISTS renders (key TEXT PRIMARY'
+                       ' KEY, output TEXT, files TEXT, created REAL)')
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def key(self, func, kwargs, inputs=()):
+        """ Hash identifying a render of func with kwargs.
+
+        Parameters
+        ----------
+        func
+            the undecorated plot function
+        kwargs : dict
+            options the plot is called with
+        inputs
+            paths of data files read by the plot
+        """
+        import fishbowl
+        from fishbowl.core import get_style
+
+        if func not in _sources:
+            _sources[func] = _source(func)
+        values = {'version': fishbowl.__version__,
+                  'cwd': os.getcwd(),
+                  'source': _sources[func],
+                  'kwargs': kwargs,
+                  'style': get_style(),
+                  'inputs': [[path, _hash_file(path)] for path in inputs]}
+        text = json.dumps(values, sort_keys=True, default=_encode)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """ Output recorded for key, None if it has changed or is missing.
+
+        """
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT output, files FROM renders WHERE key = ?',
+                (key,)).fetchone()
+        if row is None:
+            return None
+        output, files = json.loads(row[0]), json.loads(row[1])
+        names = [output] if isinstance(output, str) else output
+        if (sorted(os.path.abspath(name) for name in names)
+                != sorted(path for path, _, _ in files)):
+            return None
+        for path, mtime, size in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            if (stat.st_mtime, stat.st_size) != (mtime, size):
+                return None
+        return output
+
+    def store(self, key, output):
+        """ Record output, a filename or list of them, as the render for key.
+
+        """
+        names = [output] if isinstance(output, str) else output
+        files = []
+        for name in names:
+            path = os.path.abspath(name)
+            stat = os.stat(path)
+            files.append([path, stat.st_mtime, stat.st_size])
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute('INSERT OR REPLACE INTO renders VALUES '
+                           '(?, ?, ?, ?)',
+                           (key, json.dumps(output), json.dumps(files),
+                            time.time()))
+
+    def entries(self):
+        """ List of CacheEntry for all recorded renders, oldest first.
+
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT key, output, created FROM renders '
+                'ORDER BY created').fetchall()
+        return [CacheEntry(key, json.loads(output), created)
+                for key, output, created in rows]
+
+    def evict(self, keys=None, older_than=None, remove_outputs=False):
+        """ Drop entries from the manifest, return the number dropped.
+
+        Without arguments every entry is dropped.
+
+        Parameters
+        ----------
+        keys
+            keys of the entries to drop
+        older_than : float
+            drop entries created more than this many seconds ago
+        remove_outputs : bool
+            also delete the output files of the dropped entries
+        """
+        query, params = [], []
+        if keys is not None:
+            keys = list(keys)
+            query.append('key IN (' + ', '.join('?' * len(keys)) + ')')
+            params.extend(keys)
+        if older_than is not None:
+            query.append('created < ?')
+            params.append(time.time() - older_than)
+        where = ' WHERE ' + ' AND '.join(query) if query else ''
+
+        with self._lock:
+            db = self._connect()
+            with db:
+                rows = db.execute('SELECT files FROM renders' + where,
+                                  params).fetchall()
+                db.execute('DELETE FROM renders' + where, params)
+        if remove_outputs:
+            for row in rows:
+                for path, _, _ in json.loads(row[0]):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return len(rows)
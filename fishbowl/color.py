@@ -7,15 +7,23 @@ support the `palettable` package.
 
 This module is used by core to set colors with the simple tools, but can also
 be accessed directly to retrieve and customize palettes.
+
+Palettes can also be derived from saved ones by name, as
+"name[:transform...][@N]", for example "goldfish:light@24". Derived palettes
+are computed on whole numpy arrays in a perceptual color space and cached.
+
+Colormaps passed to cmap are registered with matplotlib once, and apply_cmap
+maps arrays to colors through cached uint8 lookup tables.
 """
 
+import binascii
 import itertools
 import matplotlib
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 from cycler import cycler
+from fishbowl import base
 from fishbowl.base import loads_from_json, saves_to_json
 
 
@@ -30,6 +38,59 @@ def next_color():
     return next(next_color._cycle)['color']
 
 
+# Colormaps registered through cmap, {name: colormap}
+_registered = {}
+
+# Lookup tables of colormaps, {(name, n): (n + 1)x4 uint8 array}
+_luts = {}
+
+
+def _register(name, colormap):
+    """ Register colormap with matplotlib as name, once.
+
+    """
+    if name in _registered:
+        return
+    try:
+        registry = matplotlib.colormaps
+    except AttributeError:
+        # matplotlib before 3.5
+        from matplotlib import cm
+        cm.register_cmap(name, colormap)
+    else:
+        if name not in registry:
+            registry.register(colormap, name=name)
+    _registered[name] = colormap
+
+
+def _get_cmap(name):
+    """ Colormap registered as name.
+
+    """
+    if name in _registered:
+        return _registered[name]
+    try:
+        return matplotlib.colormaps[name]
+    except AttributeError:
+        from matplotlib import cm
+        return cm.get_cmap(name)
+
+
+def _lut(name, n):
+    """ Lookup table of n uint8 RGBA colors for the colormap name.
+
+    The bad color of the colormap is appended as the last row.
+    """
+    key = (name, n)
+    if key not in _luts:
+        colormap = _get_cmap(name)
+        lut = np.empty((n + 1, 4), dtype=np.uint8)
+        lut[:n] = colormap(np.linspace(0, 1, n), bytes=True)
+        lut[n] = colormap(np.nan, bytes=True)
+        _luts[key] = lut
+    return _luts[key]
+
+
 def cmap(arg):
     """ Configuration for cmap specified by arg
 
@@ -39,7 +100,7 @@ def cmap(arg):
         any cmap known by matplotlib or a palettable.palette instance.
     """
     if hasattr(arg, 'mpl_colormap'):
-        matplotlib.cm.register_cmap(arg.name, arg.mpl_colormap)
+        _register(arg.name, arg.mpl_colormap)
         return {'image.cmap': arg.name}
     elif isinstance(arg, str):
         return {'image.cmap': arg}
@@ -48,6 +109,54 @@ def cmap(arg):
                          + str(arg))
 
 
+def apply_cmap(array, name=None, vmin=None, vmax=None, n=256):
+    """ Map an array of values to uint8 RGBA colors through a colormap.
+
+    Values are scaled linearly between vmin and vmax, values outside are
+    clipped to the ends of the colormap and nan or inf get its bad color.
+
+    Parameters
+    ----------
+    array : array_like
+        values to map, of any shape
+    name
+        name of the colormap or a palettable.palette instance,
+        defaults to the current image.cmap
+    vmin, vmax : float
+        values mapped to the ends of the colormap,
+        default to the finite minimum and maximum of array
+    n : int
+        number of colors in the lookup table
+
+    Returns
+    -------
+    uint8 array with the shape of array and a last axis of RGBA
+    """
+    if name is None:
+        name = matplotlib.rcParams['image.cmap']
+    name = cmap(name)['image.cmap']
+    lut = _lut(name, n)
+
+    array = np.asarray(array, dtype=float)
+    finite = np.isfinite(array)
+    bad = None if finite.all() else ~finite
+    if vmin is None or vmax is None:
+        values = array if bad is None else array[finite]
+        if vmin is None:
+            vmin = values.min() if values.size else 0.
+        if vmax is None:
+            vmax = values.max() if values.size else 1.
+    scale = n / float(vmax - vmin) if vmax > vmin else 0.
+
+    index = np.subtract(array, vmin)
+    index *= scale
+    np.clip(index, 0, n - 1, out=index)
+    if bad is not None:
+        index[bad] = n
+    index = index.astype(np.intp)
+    return lut.take(index, axis=0)
+
+
 @loads_from_json('fishbowl.palettes.json')
 def palette(arg):
     """ Configuration for palette specified by arg
@@ -59,6 +168,14 @@ def palette(arg):
     """
     if hasattr(arg, 'hex_colors'):
         return {'color.palette': arg.hex_colors}
+    if isinstance(arg, str) and ('@' in arg or ':' in arg):
+        name, _, n = arg.partition('@')
+        name, _, transform = name.partition(':')
+        try:
+            n = int(n) if n else None
+        except ValueError:
+            return None
+        return {'color.palette': generate_palette(name, n, transform or None)}
 
 
 @saves_to_json('fishbowl.palettes.json')
@@ -76,6 +193,245 @@ def save_palette(name, config):
     return palette(config)
 
 
+# sRGB to XYZ (D65) and to the cone responses used by OKLab
+_xyz = np.array([[0.4124564, 0.3575761, 0.1804375],
+                 [0.2126729, 0.7151522, 0.0721750],
+                 [0.0193339, 0.1191920, 0.9503041]])
+_white = np.array([0.95047, 1.0, 1.08883])
+_lms = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                 [0.2119034982, 0.6806995451, 0.1073969566],
+                 [0.0883024619, 0.2817188376, 0.6299787005]])
+_oklab = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                   [1.9779984951, -2.4285922050, 0.4505937099],
+                   [0.0259040371, 0.7827717662, -0.8086757660]])
+_rgb, _lms_rgb, _oklab_lms = (np.linalg.inv(m) for m in (_xyz, _lms, _oklab))
+
+
+def to_rgb(colors):
+    """ Nx3 array of RGB values in [0, 1] for a list of colors.
+
+    Lists of "#rrggbb" strings are parsed in one pass, any other colors
+    are converted by matplotlib.
+    """
+    colors = list(colors)
+    text = ''.join(colors) if all(isinstance(c, str) for c in colors) else ''
+    if text and len(text) == 7 * len(colors) and text[::7] == '#' * len(colors):
+        try:
+            values = binascii.unhexlify(text.replace('#', ''))
+            return np.frombuffer(values, np.uint8).reshape(-1, 3) / 255.
+        except (TypeError, ValueError):
+            pass
+    return matplotlib.colors.to_rgba_array(colors)[:, :3]
+
+
+def to_hex(rgb):
+    """ List of "#rrggbb" strings for an Nx3 array of RGB values in [0, 1].
+
+    Values outside of [0, 1] are clipped.
+    """
+    values = np.round(255 * np.clip(rgb, 0, 1)).astype(np.uint8)
+    text = binascii.hexlify(values.tobytes()).decode('ascii')
+    return ['#' + text[i:i + 6] for i in range(0, len(text), 6)]
+
+
+def _linear(rgb):
+    """ Undo the sRGB gamma. """
+    rgb = np.asarray(rgb, dtype=float)
+    return np.where(rgb <= 0.04045, rgb / 12.92,
+                    ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def _gamma(linear):
+    """ Apply the sRGB gamma. """
+    linear = np.clip(linear, 0, None)
+    return np.where(linear <= 0.0031308, 12.92 * linear,
+                    1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def rgb_to_lab(rgb):
+    """ CIELAB (D65) coordinates of an Nx3 array of RGB values.
+
+    """
+    xyz = _linear(rgb).dot(_xyz.T) / _white
+    delta = 6 / 29.
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz),
+                 xyz / (3 * delta ** 2) + 4 / 29.)
+    return np.stack([116 * f[..., 1] - 16,
+                     500 * (f[..., 0] - f[..., 1]),
+                     200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def lab_to_rgb(lab):
+    """ RGB values of an Nx3 array of CIELAB (D65) coordinates.
+
+    Colors outside of the sRGB gamut are clipped.
+    """
+    lab = np.asarray(lab, dtype=float)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200],
+                 axis=-1)
+    delta = 6 / 29.
+    xyz = np.where(f > delta, f ** 3, 3 * delta ** 2 * (f - 4 / 29.))
+    return np.clip(_gamma((xyz * _white).dot(_rgb.T)), 0, 1)
+
+
+def rgb_to_oklab(rgb):
+    """ OKLab coordinates of an Nx3 array of RGB values.
+
+    """
+    return np.cbrt(_linear(rgb).dot(_lms.T)).dot(_oklab.T)
+
+
+def oklab_to_rgb(lab):
+    """ RGB values of an Nx3 array of OKLab coordinates.
+
+    Colors outside of the sRGB gamut are clipped.
+    """
+    lms = np.asarray(lab, dtype=float).dot(_oklab_lms.T) ** 3
+    return np.clip(_gamma(lms.dot(_lms_rgb.T)), 0, 1)
+
+
+# Conversions from and to RGB for each color space
+_spaces = {
+    'rgb': (np.asarray, np.asarray),
+    'lab': (rgb_to_lab, lab_to_rgb),
+    'oklab': (rgb_to_oklab, oklab_to_rgb),
+}
+
+
+def interpolate(colors, n, space='oklab'):
+    """ n colors evenly spaced along a list of colors.
+
+    Parameters
+    ----------
+    colors
+        list of colors understood by matplotlib
+    n : int
+        number of colors to return
+    space : str
+        color space to interpolate in, 'oklab', 'lab' or 'rgb'
+
+    Returns
+    -------
+    nx3 array of RGB values
+    """
+    forward, backward = _spaces[space]
+    points = forward(to_rgb(colors))
+    if len(points) == 1:
+        return backward(np.repeat(points, n, axis=0))
+    position = np.linspace(0, len(points) - 1, n)
+    index = np.minimum(position.astype(int), len(points) - 2)
+    weight = (position - index)[:, np.newaxis]
+    return backward((1 - weight) * points[index] + weight * points[index + 1])
+
+
+def _lightness(scale):
+    """ Transform scaling the distance of OKLab lightness from white. """
+    def transform(lab):
+        lab = lab.copy()
+        lab[:, 0] = 1 - scale * (1 - lab[:, 0])
+        return lab
+    return transform
+
+
+def _chroma(scale):
+    """ Transform scaling the OKLab chroma. """
+    def transform(lab):
+        lab = lab.copy()
+        lab[:, 1:] *= scale
+        return lab
+    return transform
+
+
+# Transforms for derived palettes, acting on OKLab coordinates
+_transforms = {
+    'light': _lightness(0.6),
+    'dark': _lightness(1.3),
+    'muted': _chroma(0.5),
+    'vivid': _chroma(1.3),
+    'reversed': lambda lab: lab[::-1],
+}
+
+# Derived palettes, {(name, n, transform, space): (signature, colors)}
+_generated = {}
+
+
+def generate_palette(name, n=None, transform=None, space='oklab'):
+    """ Derive a palette from the palette saved as name.
+
+    Results are cached until the saved palettes change.
+
+    Parameters
+    ----------
+    name : str
+        name of a palette known by fishbowl
+    n : int
+        number of colors, interpolated from the saved colors in space
+        defaults to the number of saved colors
+    transform : str
+        transforms applied to the colors, separated by ":"
+        any of 'light', 'dark', 'muted', 'vivid' and 'reversed'
+    space : str
+        color space to interpolate in, 'oklab', 'lab' or 'rgb'
+
+    Returns
+    -------
+    list of hex colors
+    """
+    key = (name, n, transform, space)
+    signature = base._signature(palette._json)
+    cached = _generated.get(key)
+    if cached is not None and cached[0] == signature:
+        return list(cached[1])
+
+    transforms = transform.split(':') if transform else []
+    for step in transforms:
+        if step not in _transforms:
+            raise ValueError('Unknown palette transform "' + step
+                             + '", expected one of '
+                             + ', '.join(sorted(_transforms)))
+    colors = palette(name)['color.palette']
+    rgb = interpolate(colors, n or len(colors), space)
+    if transforms:
+        lab = rgb_to_oklab(rgb)
+        for step in transforms:
+            lab = _transforms[step](lab)
+        rgb = oklab_to_rgb(lab)
+    colors = to_hex(rgb)
+    _generated[key] = (signature, colors)
+    return list(colors)
+
+
+def _palette_image(colors, block, sep, background):
+    """ RGB image of boxes for each color in a list of lists of colors.
+
+    Rows may have different lengths, missing boxes show the background.
+    """
+    rows = len(colors)
+    cols = max(len(row) for row in colors)
+    side = block + 2 * sep
+
+    # Color of each box, with the background as the first entry
+    lut = np.empty((rows * cols + 1, 3), dtype=np.uint8)
+    lut[:] = np.round(255 * np.array(matplotlib.colors.to_rgb(background)))
+    flat = list(itertools.chain(*colors))
+    if flat:
+        boxes = np.concatenate([row * cols + np.arange(len(row_colors)) + 1
+                                for row, row_colors in enumerate(colors)])
+        rgb = matplotlib.colors.to_rgba_array(flat)[:, :3]
+        lut[boxes.astype(int)] = np.round(255 * rgb)
+
+    # Box number of each pixel, 0 for the background between boxes
+    dtype = np.min_scalar_type(len(lut))
+    inside = np.zeros(side, dtype=bool)
+    inside[sep:sep + block] = True
+    y = np.repeat(np.arange(rows, dtype=dtype) * cols + 1, side)
+    x = np.repeat(np.arange(cols, dtype=dtype), side)
+    index = ((y[:, np.newaxis] + x)
+             * (np.tile(inside, rows)[:, np.newaxis] & np.tile(inside, cols)))
+    return lut[index]
+
+
 def draw_box_palette(colors, save_name=None, block=10,
                      sep=1, background='white'):
     """ Draw a series of boxes of color in a grid to show a palette.
@@ -95,36 +451,77 @@ def draw_box_palette(colors, save_name=None, block=10,
     background
         color of the background between palettes
     """
-    if not hasattr(colors[0], "__iter__"):
-        colors = [colors]
-
-    # Calculate pixel sizes
-    rows = len(colors)
-    cols = len(colors[0])
-    side = block + 2 * sep
-    image = np.zeros((side * rows, side * cols))
+    import matplotlib.pyplot as plt
 
-    # Assign a unique, consecutive value to each color block
-    for col in range(cols):
-        for row in range(rows):
-            image[sep + side * row: sep + block + side * row, sep +
-                  side * col:sep + block + side * col] = rows * col + row + 1
+    if matplotlib.colors.is_color_like(colors[0]):
+        colors = [colors]
+    image = _palette_image(colors, block, sep, background)
 
     # Figure without border or axis, sized to just contain the blocks
+    rows, cols = len(colors), max(len(row) for row in colors)
     fig = plt.figure(frameon=False, figsize=(cols, rows))
     ax = plt.Axes(fig, [0., 0., 1., 1.])
     ax.set_axis_off()
     fig.add_axes(ax)
 
-    # Show it as an image, using one color per box value in a cmap
-    ax.imshow(image,
-              cmap=matplotlib.colors.ListedColormap(
-                  [background] + list(itertools.chain(*colors))),
-              interpolation="nearest")
+    ax.imshow(image, interpolation="nearest")
     if save_name:
         fig.savefig(save_name, dpi=120)
 
 
+def draw_palette_sheet(names=None, save_name=None, block=20, sep=2,
+                       background='white', dpi=100):
+    """ Draw many palettes into one sheet, one palette per row.
+
+    The sheet is drawn at its native resolution, each pixel of the boxes
+    is one pixel of the output, with the palette names to the left.
+
+    Parameters
+    ----------
+    names
+        names of palettes known by fishbowl, defaults to all saved palettes
+    save_name : str
+        if provided, saves the sheet to save_name
+    block : int
+        size of the side of each box (pixels)
+    sep : int
+        separation between each box (pixels)
+    background
+        color of the background between palettes
+    dpi : float
+        resolution of the figure, which sets the size of the names
+
+    Returns
+    -------
+    the matplotlib Figure of the sheet
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    if names is None:
+        names = sorted(name for name, config
+                       in base._load_json(palette._json).items()
+                       if 'color.palette' in config)
+    colors = [palette(name)['color.palette'] for name in names]
+    image = _palette_image(colors, block, sep, background)
+
+    # Leave room for the names to the left of the boxes
+    side = block + 2 * sep
+    margin = side * max([len(name) for name in names] + [0]) // 2 + side
+    height, width = image.shape[:2]
+    fig = Figure(figsize=((width + margin) / float(dpi), height / float(dpi)),
+                 dpi=dpi, facecolor=background)
+    FigureCanvasAgg(fig)
+    fig.figimage(image, xo=margin, yo=0, origin='upper')
+    for row, name in enumerate(names):
+        fig.text((margin - sep) / float(width + margin),
+                 1 - (row + 0.5) / len(names), name,
+                 ha='right', va='center', size=block * 0.5 * 72 / dpi)
+    if save_name:
+        fig.savefig(save_name, dpi=dpi, facecolor=background)
+    return fig
+
+
 def draw_sin_palette(colors, save_name=None):
     """ Draw a series of sin waves in each color to show a palette.
 
@@ -135,6 +532,8 @@ def draw_sin_palette(colors, save_name=None):
     save_name : str
         if provided, saves plot to save_name
     """
+    import matplotlib.pyplot as plt
+
     fig, (ax) = plt.subplots()
     ax.set_prop_cycle(cycler('color', colors))
     n = len(colors)
@@ -4,43 +4,132 @@ core - Style setup and control tools.
 Provides simple tools for setting style that should be used the majority
 of the time when creating graphics.
 
-style       - Set style temporarily within a ``with`` statement
-set_style   - Globally set style according to provided options
-reset_style - Globally reset style to matplotlib defaults
-get_style   - Return the current style options dictionary
+style         - Set style temporarily within a ``with`` statement
+set_style     - Globally set style according to provided options
+reset_style   - Globally reset style to matplotlib defaults
+get_style     - Return the current style options dictionary
+compile_style - Return a validated, reusable bundle for a set of options
+
+Styles set with style are kept on a stack of layers, each recording only
+the options it changed, so entering and leaving nested styles only writes
+those options. push_style and pop_style manage the stack directly. Each
+thread and task has its own stack, but the style they set is global:
+styles from different threads are undone in the order they were pushed,
+so the style is right again once all of them are popped.
+
+push_style    - Apply a style on top of the current one
+pop_style     - Undo the last style pushed
+
+Styles can also be scoped to the current thread or asyncio task with
+scoped_style. A scoped style does not change the global rcParams, it is
+only written to them inside rc_context. matplotlib reads rcParams when
+artists are created and drawn, so everything drawn with a scoped style must
+happen inside rc_context: the plot decorator holds it for the whole render,
+while subplots and figure only hold it while the figure is created. Code
+inside rc_context runs one thread at a time, scoped styles keep renders
+with different styles apart but do not make them run in parallel.
+
+scoped_style  - Set style for the current context within a ``with`` statement
+rc_context    - Temporarily apply the scoped style to draw figures
+subplots      - Create a figure and axes with the scoped style
+figure        - Create a figure with the scoped style
 """
 
+import threading
 import matplotlib
+from fishbowl import base
 from fishbowl import color
 from fishbowl import font as ft
 from fishbowl import axes as ax
 
 from contextlib import contextmanager
-from cycler import cycler
+from cycler import cycler, Cycler
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
-_defaultparams = matplotlib.rcParams.copy()
+
+def _rc_copy():
+    """ Copy of rcParams as a plain dictionary.
+
+    Values are copied as stored, newer matplotlib resolves the backend (and
+    imports pyplot) when it is read through rcParams.
+    """
+    rc = matplotlib.rcParams
+    return dict((key, dict.__getitem__(rc, key)) for key in dict.keys(rc))
+
+
+_defaultparams = _rc_copy()
+
+# Style options set globally, returned by get_style
+_current_options = _defaultparams.copy()
+
+# Bundles from compile_style, {arguments: (config signature, bundle)}
+_compiled = {}
+
+# rc parameters of the style set with scoped_style in this context
+_scoped = base._context_var('fishbowl_scoped_style')
+
+# Held within rc_context, while a scoped style may be in the global rcParams
+_rc_lock = threading.RLock()
+
+# Style options used by fishbowl itself, which are not rcParams
+_fishbowl_options = ('fishbowl.rasterize',)
+
+# Tuple of the layers pushed by push_style in this context, like
+# scoped_style, each {key: (previous option, previous rc)} for the keys it
+# changed
+_stack = base._context_var('fishbowl_style_stack')
+
+# Layers of all contexts in the order they were pushed, held with
+# _layers_lock while the global style is changed by push or pop
+_layers = []
+_layers_lock = threading.RLock()
+
+# Marks options which were not set before a layer
+_missing = object()
 
 
 # ------------------------------------------------------------
 # Style Configuration
 # ------------------------------------------------------------
 
-def _set_style(options):
-    """ Internal implementation of style setting.
+def _rc_options(options):
+    """ Convert fishbowl style options in place to rc parameters.
 
     """
-    _set_style.current_options = options
-
     palette = options.pop('color.palette', None)
     if palette:
         options['axes.prop_cycle'] = cycler('color', palette)
+    return options
+
+
+def _apply(params, validate=True):
+    """ Write the params that differ from the current rcParams.
+
+    Validation can be skipped for params that were already validated.
+    """
+    rc = matplotlib.rcParams
+    for key, value in params.items():
+        if key in _fishbowl_options or dict.get(rc, key) == value:
+            continue
+        if validate:
+            rc[key] = value
+        else:
+            dict.__setitem__(rc, key, value)
 
-    # Remaining options are rcParams
-    matplotlib.rcParams.update(options)
 
+def _set_style(options):
+    """ Internal implementation of style setting.
+
+    """
+    global _current_options
+    _current_options = options
 
-_set_style.current_options = _defaultparams.copy()
+    # Remaining options are rcParams
+    _apply(_rc_options(options))
 
 
 def reset_style():
@@ -55,14 +144,29 @@ def get_style():
     """ Return a complete style dictionary matching the current style.
 
     This dictionary is mostly the rc parameters from matplotlib, with
-    a few additional options handled by set_style.
+    a few additional options handled by set_style. Within scoped_style this
+    includes the scoped options.
 
     """
-    return _set_style.current_options.copy()
+    options = _current_options.copy()
+    scoped = _scoped.get()
+    if scoped:
+        options.update(scoped)
+    return options
+
+
+def _get_option(key, default=None):
+    """ One option of the current style, without copying the style.
+
+    """
+    scoped = _scoped.get()
+    if scoped and key in scoped:
+        return scoped[key]
+    return _current_options.get(key, default)
 
 
 def set_style(axes='minimal', palette='goldfish',
-              cmap='YlGnBu', font='Inconsolata', style=None):
+              cmap='YlGnBu', font='Inconsolata', rasterize=None, style=None):
     """ Set the global style.
 
     Parameters
@@ -79,6 +183,9 @@ def set_style(axes='minimal', palette='goldfish',
     fonts
          Name of the font style to use, typically just a font name
          Accepts names of saved font configurations or names of system fonts.
+    rasterize
+         Lines and collections with more vertices and markers than this are
+         rasterized in vector output saved by the plot decorator
     style
          A dictionary that contains all style options
          If provided other keywords are ignored
@@ -89,31 +196,287 @@ def set_style(axes='minimal', palette='goldfish',
         _set_style(style)
         return
 
-    style = get_style()
+    compile_style(axes=axes, palette=palette, cmap=cmap, font=font,
+                  rasterize=rasterize).apply()
+
+
+class StyleBundle(Mapping):
+    """ Immutable set of validated rc parameters for one style.
+
+    Created by compile_style. Applying a bundle only writes the parameters
+    that differ from the current rcParams and skips validating them again.
+    List parameters are stored as tuples and the prop cycle is copied when
+    read, rcParams are given lists and cycles of their own.
+    """
+
+    def __init__(self, options):
+        rc = matplotlib.rcParams
+        params = dict((key, value if key in _fishbowl_options
+                       else rc.validate[key](value))
+                      for key, value in _rc_options(options).items())
+        self._lists = frozenset(key for key, value in params.items()
+                                if isinstance(value, list))
+        self._params = dict((key, tuple(value) if key in self._lists
+                             else value) for key, value in params.items())
+
+    def __getitem__(self, key):
+        value = self._params[key]
+        return Cycler(value) if isinstance(value, Cycler) else value
+
+    def __iter__(self):
+        return iter(self._params)
+
+    def __len__(self):
+        return len(self._params)
+
+    def _rc_params(self):
+        """ Copy of the parameters as they are stored in rcParams.
+
+        """
+        return dict((key, list(value) if key in self._lists
+                     else self[key]) for key, value in self._params.items())
+
+    def apply(self):
+        """ Set this style globally.
+
+        """
+        params = self._rc_params()
+        _current_options.update(params)
+        _apply(params, validate=False)
 
-    # Colors
-    style.update(color.palette(palette))
-    style.update(color.cmap(cmap))
+
+def _config_signature():
+    """ Signature of the saved configurations a compiled style depends on.
+
+    """
+    return (tuple(base._signature(func._json)
+                  for func in (ax.axes, color.palette, ft.font))
+            + (ft._fallback,))
+
+
+def compile_style(axes='minimal', palette='goldfish',
+                  cmap='YlGnBu', font='Inconsolata', rasterize=None):
+    """ Return a validated style bundle for the options.
+
+    Bundles are memoized by their arguments and compiled again only if a
+    saved configuration changes. Arguments are the same as set_style.
+
+    See Also
+    --------
+    StyleBundle.apply: set the compiled style globally
+
+    """
+    key = (axes, palette, cmap, font, rasterize)
+    signature = _config_signature()
+    try:
+        cached = _compiled.get(key)
+    except TypeError:
+        # Unhashable arguments, e.g. a list of colors, are not memoized
+        key, cached = None, None
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    options = {}
+
+    # Colors, saved configurations are read without copying
+    options.update(color.palette._saved(palette))
+    options.update(color.cmap(cmap))
 
     # Axes
-    style.update(ax.axes(axes))
+    options.update(ax.axes._saved(axes))
 
     # Fonts
-    style.update(ft.font(font))
+    options.update(ft.font._saved(font))
 
-    _set_style(style)
+    # Output
+    options['fishbowl.rasterize'] = rasterize
+
+    bundle = StyleBundle(options)
+    if key is not None:
+        _compiled[key] = (signature, bundle)
+    return bundle
+
+
+def push_style(**kwargs):
+    """ Apply a style on top of the current one.
+
+    Only the options which change are written, and their previous values
+    are recorded so pop_style can restore them. Accepts the same arguments
+    as set_style.
+
+    Returns
+    -------
+    the depth of the stack before the push, see pop_style
+    """
+    if kwargs.get('style'):
+        # Complete styles are not compiled, so are validated when written
+        params, validate = _rc_options(dict(kwargs['style'])), True
+    else:
+        kwargs.pop('style', None)
+        params, validate = compile_style(**kwargs)._rc_params(), False
+
+    rc = matplotlib.rcParams
+    with _layers_lock:
+        layer = {}
+        for key, value in params.items():
+            option = _current_options.get(key, _missing)
+            previous = (_missing if key in _fishbowl_options
+                        else dict.get(rc, key))
+            if option != value or previous not in (_missing, value):
+                layer[key] = (option, previous)
+
+        stack = _stack.get() or ()
+        depth = len(stack)
+        _stack.set(stack + (layer,))
+        _layers.append(layer)
+        try:
+            for key in layer:
+                _current_options[key] = params[key]
+            _apply(dict((key, params[key]) for key in layer), validate)
+        except BaseException:
+            pop_style(depth)
+            raise
+    return depth
+
+
+def pop_style(depth=None):
+    """ Undo the last style pushed with push_style.
+
+    Options changed by other means while the style was pushed, e.g. by
+    set_style, are kept unless the style changed them too. Each thread and
+    asyncio task has its own stack, so only styles pushed in the current
+    one can be popped. If a style pushed later in another thread changed
+    the same options, they are left to it and restored when it is popped.
+
+    Parameters
+    ----------
+    depth : int
+        pop all layers above this depth instead, as returned by push_style
+    """
+    stack = _stack.get() or ()
+    if depth is None:
+        depth = len(stack) - 1
+    if depth < 0:
+        raise IndexError('pop_style called without a pushed style')
+    rc = matplotlib.rcParams
+    with _layers_lock:
+        _stack.set(stack[:depth])
+        for layer in reversed(stack[depth:]):
+            index = next(index for index, other in enumerate(_layers)
+                         if other is layer)
+            above = _layers[index + 1:]
+            del _layers[index]
+            for key, restore in layer.items():
+                later = next((other for other in above if key in other),
+                             None)
+                if later is not None:
+                    # Restored when the later layer is popped instead
+                    later[key] = restore
+                    continue
+                option, previous = restore
+                if option is _missing:
+                    _current_options.pop(key, None)
+                else:
+                    _current_options[key] = option
+                if previous is not _missing:
+                    # The previous value was already validated
+                    dict.__setitem__(rc, key, previous)
 
 
 @contextmanager
 def style(**kwargs):
     """ Context manager for using style settings temporarily.
 
+    Only the options the style changes are restored on exit, also when the
+    body raises.
+
     See Also
     --------
     set_style: called with kwargs within the context
+    push_style: apply a style until pop_style is called
+    scoped_style: set style only for the current thread or task
+
+    """
+    depth = push_style(**kwargs)
+    try:
+        yield
+    finally:
+        pop_style(depth)
+
+
+@contextmanager
+def scoped_style(**kwargs):
+    """ Context manager for a style local to the current thread or task.
+
+    Unlike style, the global rcParams are not changed. The style is used
+    for artists created and drawn within rc_context, so threads or asyncio
+    tasks can render with different styles without seeing each other's.
+    Nested scopes are combined.
+
+    See Also
+    --------
+    compile_style: called with kwargs to create the scoped style
+    subplots: create a figure and axes using the scoped style
+
+    """
+    params = dict(_scoped.get() or {})
+    params.update(compile_style(**kwargs)._rc_params())
+    token = _scoped.set(params)
+    try:
+        yield
+    finally:
+        _scoped.reset(token)
+
+
+@contextmanager
+def rc_context():
+    """ Context manager applying the scoped style to the global rcParams.
+
+    Artists read most of their style from rcParams when created, and fonts
+    are resolved when drawn, so figures should be created, drawn on and
+    saved within this context. Artists added after it exits use the global
+    rcParams. Other threads wait until it exits before entering it, with or
+    without a scoped style, so they never see this context's style through
+    rc_context. The global style can still be changed meanwhile, e.g. by
+    set_style in another thread, which is seen within the context and kept
+    when it exits.
+
+    """
+    params = _scoped.get()
+    with _rc_lock:
+        if not params:
+            yield
+            return
+        rc = matplotlib.rcParams
+        previous = dict((key, dict.get(rc, key)) for key in params)
+        _apply(params, validate=False)
+        try:
+            yield
+        finally:
+            # Keep values written by others since, params are stored as is
+            _apply(dict((key, value) for key, value in previous.items()
+                        if dict.get(rc, key) is params[key]), validate=False)
+
+
+def subplots(*args, **kwargs):
+    """ Create a figure and axes using the scoped style.
+
+    Accepts the same arguments as matplotlib.pyplot.subplots. Only the
+    figure and axes are created with the style, draw on them within
+    rc_context to use it for artists too.
+    """
+    import matplotlib.pyplot as plt
+    with rc_context():
+        return plt.subplots(*args, **kwargs)
+
+
+def figure(*args, **kwargs):
+    """ Create a figure using the scoped style.
 
+    Accepts the same arguments as matplotlib.pyplot.figure. Only the figure
+    is created with the style, draw on it within rc_context to use it for
+    artists too.
     """
-    initial_style = get_style()
-    set_style(**kwargs)
-    yield
-    set_style(style=initial_style)
+    import matplotlib.pyplot as plt
+    with rc_context():
+        return plt.figure(*args, **kwargs)
@@ -0,0 +1,112 @@
+"""
+decimate - Reduce large series to the points that can be seen
+
+A series with millions of points drawn on axes a few thousand pixels wide
+mostly draws vertices on top of each other. These functions select a subset
+of points which looks the same, and aggregate error bars to match. Series are
+assumed to be sorted by x. minmax splits them into buckets covering equal
+ranges of x, like the pixel columns of the axes, lttb into buckets with equal
+counts.
+
+minmax   - Keep the minimum and maximum of each bucket
+lttb     - Largest triangle three buckets
+envelope - Aggregate error bars over the buckets of the selected points
+"""
+
+import numpy as np
+
+
+def minmax(x, y, n):
+    """ Indices of the minimum and maximum y in each of n buckets of x.
+
+    The buckets split the range of x into n equal parts, so with n pixel
+    columns the extrema of every column are kept exactly, along with the
+    first and last points. Buckets without points are dropped. Returns
+    (indices, edges), where edges are the bucket boundaries.
+    """
+    if n < 1:
+        raise ValueError('minmax needs at least one bucket, got ' + str(n))
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y)
+    bounds = np.linspace(x[0], x[-1], n + 1)[1:-1]
+    starts = np.unique(np.append(0, np.searchsorted(x, bounds)))
+    starts = starts[starts < len(y)]
+    edges = np.append(starts, len(y))
+
+    bucket = np.repeat(np.arange(len(starts)), np.diff(edges))
+    indices = [[0, len(y) - 1]]
+    for reduce_ in (np.fmin, np.fmax):
+        # First point of each bucket equal to its extreme, nan is skipped
+        extreme = reduce_.reduceat(y, starts)
+        matches = np.flatnonzero(y == extreme[bucket])
+        first = np.unique(bucket[matches], return_index=True)[1]
+        indices.append(matches[first])
+    return np.unique(np.concatenate(indices)), edges
+
+
+def lttb(x, y, n):
+    """ Indices of n points selected by largest triangle three buckets.
+
+    The first and last points are kept, the rest is split into n - 2 buckets
+    and from each the point forming the largest triangle with the point kept
+    from the previous bucket and the average of the next one is kept.
+    Returns (indices, edges), where edges are the bucket boundaries.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if n >= len(x) or n < 3:
+        indices = np.arange(len(x))
+        return indices, np.append(indices, len(x))
+
+    edges = np.linspace(1, len(x) - 1, n - 1).astype(int)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # The last bucket is followed by the last point
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    indices = np.empty(n, dtype=int)
+    indices[0], indices[-1] = 0, len(x) - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - mean_x[i]) * (y[start:end] - ay)
+                      - (ax - x[start:end]) * (mean_y[i] - ay))
+        a = start + area.argmax()
+        indices[i + 1] = a
+    return indices, np.concatenate([[0], edges, [len(x)]])
+
+
+def envelope(y, yerr, indices, edges):
+    """ Error bars for the points at indices which cover their whole bucket.
+
+    Parameters
+    ----------
+    y : array_like
+        the full series
+    yerr : array_like
+        scalar, N or 2xN errors for the full series
+    indices : array_like
+        selected points, from minmax or lttb
+    edges : array_like
+        bucket boundaries, from minmax or lttb
+
+    Returns
+    -------
+    2xM array of lower and upper errors for the selected points
+    """
+    y = np.asarray(y, dtype=float)
+    yerr = np.asarray(yerr, dtype=float)
+    if yerr.ndim == 2:
+        lower, upper = yerr
+    else:
+        lower = upper = np.broadcast_to(yerr, y.shape)
+    starts = edges[:-1]
+    low = np.minimum.reduceat(y - lower, starts)
+    high = np.maximum.reduceat(y + upper, starts)
+
+    bucket = np.searchsorted(starts, indices, side='right') - 1
+    selected = y[indices]
+    return np.array([selected - low[bucket], high[bucket] - selected])
@@ -1,11 +1,22 @@
-import itertools
-import pydoc
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import matplotlib.offsetbox as offsetbox
+import threading
 
-from mpl_toolkits.axes_grid.anchored_artists import AnchoredText
-from functools import wraps
+from contextlib import contextmanager
+from functools import wraps, partial
+from fishbowl import base, profiling
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# Axes being drawn by a plot function, used by the draw functions
+_current_axes = base._context_var('fishbowl_axes')
 
 
 def _decorate_all(decorators):
@@ -80,6 +91,7 @@ def setup_axes(ax, **kwargs):
         Format the y ticks as dollars
 
     """
+    import matplotlib.ticker as ticker
 
     # Handle some shortcut syntaxes
     if kwargs.get('xticks') is not None and 'xticklabels' not in kwargs:
@@ -178,6 +190,8 @@ def text(ax, text=None, text_location="upper left", **kwargs):
     """
     if text is None:
         return
+    from matplotlib.offsetbox import AnchoredText
+
     locations = {'best': 0,
                  'upper right': 1,
                  'upper left': 2,
@@ -230,6 +244,8 @@ def legend(ax, legend=None, legend_text=None, **kwargs):
     """
     if legend is None:
         return
+    import matplotlib.offsetbox as offsetbox
+
     bbox = {}
     # Specify x,y coordinates for upper left corner
     if '(' in legend:
@@ -258,33 +274,334 @@ def legend(ax, legend=None, legend_text=None, **kwargs):
     return legend
 
 
-def plot(func):
+# Command line options for the plot helpers as (name, type, help), matching
+# the parameters documented by each helper so their docstrings need not be
+# parsed when plots are decorated
+_cli_options = (
+    ('title', str, 'Text to be placed on top center of axes.'),
+    ('xmin', float, 'Set minimum of x-axis.'),
+    ('xmax', float, 'Set maximum of x-axis.'),
+    ('ymin', float, 'Set minimum of y-axis.'),
+    ('ymax', float, 'Set maximum of y-axis.'),
+    ('logx', bool, 'Use log scale for x-axis'),
+    ('logy', bool, 'Use log scale for y-axis'),
+    ('xlabel', str, 'Label for x-axis.'),
+    ('ylabel', str, 'Label for y-axis.'),
+    ('xticks', str, 'String holding space-separated tick locations'),
+    ('xticklabels', str, 'String hold space-separated tick labels'),
+    ('xtickrot', float, 'Rotation for tick labels'),
+    ('yticks', str, 'String holding space-separated tick locations'),
+    ('yticklabels', str, 'String hold space-separated tick labels'),
+    ('ytickrot', float, 'Rotation for tick labels'),
+    ('xpercent', bool, 'Format the x ticks as percentages'),
+    ('ypercent', bool, 'Format the y ticks as percentages'),
+    ('xdollar', bool, 'Format the x ticks as dollars'),
+    ('ydollar', bool, 'Format the y ticks as dollars'),
+    ('text', str, 'The text to put on the axis'),
+    ('text_location', str,
+     'One of matplotlibs string or integer locations or a tuple of x,y'),
+    ('legend', str, 'either a mpl name for the location or tuple coordinates'),
+    ('legend_text', str, 'additional text to place above legend'),
+)
+
+
+_formats_help = ('Comma separated formats to save each output in, '
+                 'e.g. png,pdf')
+
+
+class FigurePool(object):
+    """ Pool of reusable figures for the plot decorator.
+
+    Figures are created without pyplot, so they are never registered with
+    its figure manager, and are cleared and reused between renders. Draw
+    on the axes passed to the plot function, pyplot's gca() does not know
+    about pooled figures.
+
+    Parameters
+    ----------
+    size : int
+        maximum number of idle figures kept for reuse
+    figsize : tuple
+        figure size in inches, defaults to rcParams['figure.figsize']
+    dpi : float
+        figure resolution, defaults to rcParams['figure.dpi']
+    """
+
+    def __init__(self, size=4, figsize=None, dpi=None):
+        self.size = size
+        self.figsize = figsize
+        self.dpi = dpi
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Return an empty figure and its axes.
+
+        """
+        with self._lock:
+            pair = self._idle.pop() if self._idle else None
+        if pair is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            fig = Figure(figsize=self.figsize, dpi=self.dpi)
+            FigureCanvasAgg(fig)
+            return fig, fig.add_subplot(111)
+
+        import matplotlib
+
+        fig, ax = pair
+        rc = matplotlib.rcParams
+        fig.set_size_inches(self.figsize or rc['figure.figsize'])
+        fig.set_dpi(self.dpi or rc['figure.dpi'])
+        fig.set_facecolor(rc['figure.facecolor'])
+        return fig, ax
+
+    def release(self, fig, ax):
+        """ Clear the figure and return it to the pool.
+
+        """
+        if fig.axes == [ax] and not (fig.texts or fig.images or fig.legends
+                                     or fig.artists or fig.lines):
+            # Clearing the axes is cheaper than creating new ones
+            ax.cla()
+        else:
+            fig.clf()
+            ax = fig.add_subplot(111)
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((fig, ax))
+
+
+@contextmanager
+def _track_memory(enabled):
+    """ Measure peak memory while the body runs.
+
+    Yields a dictionary which is filled when the body exits. peak_memory is
+    the peak of memory traced by tracemalloc in bytes, which includes numpy
+    arrays, and max_rss the maximum resident set size of the process.
+    """
+    usage = {}
+    if not enabled:
+        yield usage
+        return
+    tracing = tracemalloc is not None and tracemalloc.is_tracing()
+    if tracemalloc is not None and not tracing:
+        tracemalloc.start()
+    peak = [None]
+    try:
+        if tracemalloc is not None:
+            # Profiled phases reset the traced peak, this keeps the highest
+            with profiling._traced_peak() as peak:
+                yield usage
+        else:
+            yield usage
+    finally:
+        if tracemalloc is not None:
+            usage['peak_memory'] = peak[0]
+            if not tracing:
+                tracemalloc.stop()
+        if resource is not None:
+            usage['max_rss'] = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+
+
+def plot(func=None, reuse=False, track_memory=False, cache=False,
+         inputs=None, profile=None, asynchronous=False, rasterize=None,
+         facets=None):
+    """ Decorator to create a plot with a standard command line interface.
+
+    The decorated function is called as func(fig, ax, **kwargs) to draw on
+    ax and returns the output filename. The plot helpers are then applied
+    with the same kwargs and the figure is saved and closed. If click is
+    installed the helper options are available on the command line.
+
+    The function may also return a list of filenames and (filename, dpi)
+    pairs, or be called with formats, e.g. --formats png,pdf, to save the
+    figure to several files from one render, see fishbowl.output.save.
+
+    Parameters
+    ----------
+    reuse : bool or FigurePool
+        draw on figures from a pool which are cleared and reused between
+        renders instead of creating new ones through pyplot
+    track_memory : bool
+        record memory usage of each render in the last_render attribute
+    cache : bool or RenderCache
+        skip rendering if the function source, options, style and inputs
+        are unchanged since the output was last written
+    inputs
+        data files read by the plot, which are part of the cache key
+        a list of paths or a function returning them from the kwargs
+    profile : bool, Profiler or function
+        record the time spent in each phase of a render in the profile
+        entry of last_render, a function is called with each Profile
+        defaults to the FISHBOWL_PROFILE environment variable
+    asynchronous : bool
+        draw the figure and return, while its files are written in the
+        background by fishbowl.save_async, the future entry of last_render
+        is done once they are written
+    rasterize : int
+        rasterize lines and collections with more vertices and markers
+        than this in vector output, defaults to the style's rasterize
+    facets : tuple
+        (nrows, ncols) to draw on a grid of panels sharing their axes, ax
+        is then a 2d array of axes and the helpers are applied to the whole
+        grid at once, see fishbowl.facet.setup_facets, reuse is ignored
+    """
+    if func is None:
+        return partial(plot, reuse=reuse, track_memory=track_memory,
+                       cache=cache, inputs=inputs, profile=profile,
+                       asynchronous=asynchronous, rasterize=rasterize,
+                       facets=facets)
+
     try:
         import click
     except ImportError:
         click = None
 
     if click:
-        doc_strings = [f.__doc__ for f in _plot_helper._functions]
         decorators = [click.command()]
-        chain = itertools.chain(*(s.split("\n") for s in doc_strings))
-        lines1, lines2 = itertools.tee(chain)
-        next(lines2, None)
-        for line1, line2 in itertools.izip(lines1, lines2):
-            if ':' in line1:
-                opt, t = [s.strip() for s in line1.split(":")]
-                decorators.append(click.option('--' + opt,
-                                               type=pydoc.locate(t),
-                                               help=line2.strip()))
+        for opt, option_type, option_help in _cli_options:
+            decorators.append(click.option('--' + opt,
+                                           type=option_type,
+                                           help=option_help))
+        decorators.append(click.option('--formats', type=str,
+                                       help=_formats_help))
         decorators.append(wraps(func))
     else:
         decorators = [wraps(func)]
 
+    if reuse is True:
+        reuse = FigurePool()
+    if cache is True:
+        from fishbowl.cache import RenderCache
+        cache = RenderCache()
+    if profile is True:
+        profile = profiling.Profiler()
+    elif profile and not isinstance(profile, profiling.Profiler):
+        profile = profiling.Profiler(hooks=[profile])
+
+    def render(kwargs):
+        if cache:
+            paths = inputs(kwargs) if callable(inputs) else inputs or ()
+            key = cache.key(func, kwargs, paths)
+            name = cache.lookup(key)
+            if name is not None:
+                plotted_func.last_render = {'output': name, 'cached': True}
+                return name
+        profiler = profile or profiling._env_profiler()
+        futures = [] if asynchronous else None
+        with _track_memory(track_memory) as usage:
+            if profiler:
+                with profiler.render(func.__name__) as record:
+                    name = _render(func, kwargs, pool=reuse or None,
+                                   profile=record, futures=futures,
+                                   rasterize=rasterize, facets=facets)
+                    record.output = name
+                usage['profile'] = record
+            else:
+                name = _render(func, kwargs, pool=reuse or None,
+                               futures=futures, rasterize=rasterize,
+                               facets=facets)
+        if futures:
+            usage['future'] = futures[0]
+            if cache:
+                futures[0].add_done_callback(
+                    partial(_store_when_written, cache, key, name))
+        elif cache:
+            cache.store(key, name)
+        usage['output'] = name
+        plotted_func.last_render = usage
+        return name
+
     @_decorate_all(decorators)
     def plotted_func(**kwargs):
-        fig, ax = plt.subplots()
-        name = func(fig, ax, **kwargs)
-        for helper in _plot_helper._functions:
-            helper(ax, **kwargs)
-        fig.savefig(name)
+        return render(kwargs)
+    plotted_func._render = render
+    plotted_func.last_render = None
     return plotted_func
+
+
+def _store_when_written(cache, key, name, future):
+    """ Record name in the render cache once future has written it.
+
+    """
+    if future.exception() is None:
+        cache.store(key, name)
+
+
+def _save(fig, name, formats, futures=None):
+    """ Save fig to the outputs named by the plot function.
+
+    Returns the filename, or the list of filenames if there are several.
+    If futures is a list, the files are written by save_async and its
+    future is appended to the list.
+    """
+    single = isinstance(name, str) and not formats
+    if single and futures is None:
+        fig.savefig(name)
+        return name
+    from fishbowl import output
+    if futures is None:
+        return output.save(fig, name, formats)
+    futures.append(output.save_async(fig, name, formats, close=False))
+    return name if single else [out for out, _
+                                in output.outputs(name, formats)]
+
+
+def _render(func, kwargs, pool=None, profile=None, futures=None,
+            rasterize=None, facets=None):
+    """ Render and save the figure drawn by func, return the output name.
+
+    The figure is closed, or returned to the pool, once it is saved. Each
+    phase is recorded in profile if one is given, and files are written in
+    the background if futures is a list, see _save. Heavy artists are
+    rasterized above rasterize, or the style's rasterize option. If facets
+    is (nrows, ncols) func draws on a grid of axes instead of the pool's.
+    """
+    import matplotlib.pyplot as plt
+    from fishbowl import core, output
+
+    phase = profile.phase if profile is not None else profiling.no_phase
+    if rasterize is None:
+        rasterize = core._get_option('fishbowl.rasterize')
+    if facets is not None:
+        pool = None
+
+    # Render with the scoped style, if any, bound to rcParams
+    with core.rc_context():
+        with phase('figure'):
+            if facets is not None:
+                from fishbowl.facet import facets as grid
+                fig, ax = grid(*facets)
+            elif pool is not None:
+                fig, ax = pool.acquire()
+            else:
+                fig, ax = plt.subplots()
+        token = _current_axes.set(ax if facets is None else ax.flat[0])
+        try:
+            with phase('plot'):
+                name = func(fig, ax, **kwargs)
+            if facets is not None:
+                from fishbowl.facet import setup_facets
+                with phase('setup_facets'):
+                    setup_facets(ax, **kwargs)
+            else:
+                for helper in _plot_helper._functions:
+                    with phase(helper.__name__):
+                        helper(ax, **kwargs)
+            with output.rasterized(fig, rasterize):
+                if profile is not None:
+                    with phase('savefig'), profile.draws(fig):
+                        name = _save(fig, name, kwargs.get('formats'),
+                                     futures)
+                else:
+                    name = _save(fig, name, kwargs.get('formats'), futures)
+        finally:
+            _current_axes.reset(token)
+            if pool is not None:
+                pool.release(fig, ax)
+            else:
+                plt.close(fig)
+    return name
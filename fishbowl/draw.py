@@ -2,38 +2,274 @@
 draw - Functions for specific ways to illustrate data
 """
 
+import os
 import numpy as np
+import matplotlib
+import matplotlib.lines
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 
-from functools import wraps
-from fishbowl.decorator import setup_axes
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.font_manager import FontProperties
+
+from functools import wraps, partial
+from fishbowl import decimate
+from fishbowl.decorator import setup_axes, _current_axes
 from fishbowl.color import next_color
 
 
-def handle_args(func):
+# More bars than this are drawn as a single collection
+_collection_bars = 500
+
+# Chunked sources are read and reduced this many points at a time
+_chunk_points = 2**20
+
+
+def handle_args(func=None, chunks=False):
     """ Handle standard arguments for plot style functions
+
+    x and y may be arrays, columns of pandas, Arrow or numpy structured
+    containers, or paths of .npy files, which are memory mapped. Columns are
+    passed on without copying where their memory can be shared.
+
+    With chunks, x and y may also be chunked sources: iterators of arrays,
+    Arrow columns with several chunks or memory maps of more than a million
+    points. If downsample is given these are reduced with 'minmax' one chunk
+    at a time before the method is applied, so they are never held in
+    memory at once. Otherwise iterators are joined into arrays and memory
+    maps are drawn as they are.
+
+    Parameters
+    ----------
+    data
+        container to look up x and y in by name, e.g. a dict, DataFrame,
+        Arrow table or structured array
+    ax
+        axes to draw on, defaults to the current axes
+    downsample : str
+        reduce series larger than the axes can show before drawing
+        'minmax' keeps the extrema of downsample_to / 2 equal ranges of x,
+        a pixel column each if the series spans the axes, 'lttb' uses
+        largest triangle three buckets and True is the same as 'minmax'
+        yerr is aggregated to cover the points which were dropped
+    downsample_to : int
+        number of points to keep, at least 2, defaults to twice the axes
+        width in pixels
     """
+    if func is None:
+        return partial(handle_args, chunks=chunks)
+
     @wraps(func)
     def default_func(x, y, data=None, **kwargs):
-        if data is not None and x in data:
+        if data is not None and _has_column(data, x):
             x = data[x]
-        if data is not None and y in data:
+        if data is not None and _has_column(data, y):
             y = data[y]
+        x, y = _column(x), _column(y)
         ax = kwargs.pop('ax', None)
         if not ax:
-            ax = plt.gca()
+            # Prefer the axes of a plot being rendered, it may be pooled
+            ax = _current_axes.get() or plt.gca()
+        method = kwargs.pop('downsample', None)
+        points = kwargs.pop('downsample_to', None)
+        if points is not None and points < 2:
+            raise ValueError('downsample_to must be at least 2, got '
+                             + str(points))
+        if _chunked(x) or _chunked(y):
+            if chunks and method:
+                x, y = _reduce_chunks(x, y, ax, points, kwargs)
+            else:
+                x, y = _join(x), _join(y)
+        if method:
+            x, y = _downsample(x, y, ax, method, points, kwargs)
         return func(x, y, ax, **kwargs)
     return default_func
 
 
-@handle_args
+def _has_column(data, key):
+    """ If the container data holds a column named key
+
+    """
+    # Structured arrays and Arrow tables can not be searched with in
+    names = getattr(getattr(data, 'dtype', None), 'names', None)
+    if names is None:
+        names = getattr(data, 'column_names', None)
+    try:
+        return key in (data if names is None else names)
+    except (TypeError, ValueError):
+        # Arrays and other unhashable values are data, not names
+        return False
+
+
+def _arrow(values):
+    """ Arrow array as a numpy array, sharing its memory if possible
+
+    """
+    try:
+        return values.to_numpy(zero_copy_only=True)
+    except ValueError:
+        # Missing values or types numpy can not view, e.g. strings
+        return values.to_numpy(zero_copy_only=False)
+
+
+def _column(values):
+    """ Column values as an array, without copying where possible
+
+    pandas columns share their memory when they are numeric without missing
+    values, nullable numbers become floats with nan for missing values.
+    Arrow columns with several chunks become an iterator of arrays and paths
+    of .npy files are memory mapped. Other values, e.g. labels, are left for
+    matplotlib to convert.
+    """
+    if isinstance(values, str):
+        if values.endswith('.npy') and os.path.isfile(values):
+            return np.load(values, mmap_mode='r')
+        return values
+    if type(values).__module__.startswith('pyarrow'):
+        chunks = getattr(values, 'chunks', None)
+        if chunks is None:
+            return _arrow(values)
+        if len(chunks) == 1:
+            return _arrow(chunks[0])
+        return (_arrow(chunk) for chunk in chunks)
+    if hasattr(values, 'to_numpy') and not isinstance(values, np.ndarray):
+        dtype = getattr(values, 'dtype', None)
+        if (getattr(dtype, 'kind', 'O') in 'biuf'
+                and not isinstance(dtype, np.dtype)):
+            # Nullable numbers would be converted to objects
+            return values.to_numpy(dtype=float, na_value=np.nan)
+        return values.to_numpy()
+    return values
+
+
+def _chunked(values):
+    """ If values should be read in chunks, iterators and large memory maps
+
+    """
+    return hasattr(values, '__next__') or (isinstance(values, np.memmap)
+                                           and len(values) > _chunk_points)
+
+
+def _join(values):
+    """ Array of all chunks of an iterator, other values as they are
+
+    """
+    if hasattr(values, '__next__'):
+        return np.concatenate([np.asarray(chunk) for chunk in values])
+    return values
+
+
+def _split(values):
+    """ Iterator of slices of values of _chunk_points each
+
+    """
+    for start in range(0, len(values), _chunk_points):
+        yield values[start:start + _chunk_points]
+
+
+def _pairs(x, y):
+    """ Aligned chunks of x and y, either of which may be an iterator
+
+    """
+    if hasattr(x, '__next__') and hasattr(y, '__next__'):
+        for pair in zip(x, y):
+            yield pair
+        return
+    if hasattr(y, '__next__'):
+        for chunk_y, chunk_x in _pairs(y, x):
+            yield chunk_x, chunk_y
+        return
+    if not hasattr(x, '__next__'):
+        x = _split(x)
+    offset = 0
+    for chunk in x:
+        yield chunk, y[offset:offset + len(chunk)]
+        offset += len(chunk)
+
+
+def _reduce_chunks(x, y, ax, points, kwargs):
+    """ Keep the minimum and maximum of each bucket of each chunk of x, y
+
+    Any yerr in kwargs is reduced to the envelope of the dropped points, it
+    may be a scalar or an array of errors for the whole series.
+    """
+    if points is None:
+        points = 2 * int(ax.get_window_extent().width)
+    yerr = kwargs.get('yerr')
+    kept_x, kept_y, kept_err = [], [], []
+    offset = 0
+    for chunk_x, chunk_y in _pairs(x, y):
+        chunk_x = np.asarray(chunk_x, dtype=float)
+        chunk_y = np.asarray(chunk_y, dtype=float)
+        if not len(chunk_y):
+            continue
+        indices, edges = decimate.minmax(chunk_x, chunk_y,
+                                         max(points // 2, 1))
+        kept_x.append(chunk_x[indices])
+        kept_y.append(chunk_y[indices])
+        if yerr is not None:
+            err = yerr
+            if np.ndim(yerr):
+                err = np.asarray(yerr)[..., offset:offset + len(chunk_y)]
+            kept_err.append(decimate.envelope(chunk_y, err, indices, edges))
+        offset += len(chunk_y)
+    if not kept_y:
+        return np.empty(0), np.empty(0)
+    if kept_err:
+        kwargs['yerr'] = np.concatenate(kept_err, axis=1)
+    return np.concatenate(kept_x), np.concatenate(kept_y)
+
+
+def _downsample(x, y, ax, method, points, kwargs):
+    """ Reduce x, y and any yerr in kwargs to the points that can be seen
+
+    """
+    if points is None:
+        points = 2 * int(ax.get_window_extent().width)
+    if np.size(y) <= points:
+        return x, y
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method is True or method == 'minmax':
+        indices, edges = decimate.minmax(x, y, points // 2)
+    elif method == 'lttb':
+        indices, edges = decimate.lttb(x, y, points)
+    else:
+        raise ValueError('Unknown downsample method: ' + str(method))
+    if kwargs.get('yerr') is not None:
+        kwargs['yerr'] = decimate.envelope(y, kwargs['yerr'], indices, edges)
+    return x[indices], y[indices]
+
+
+@handle_args(chunks=True)
 def line(x, y, ax, **kwargs):
     """ Draw a line connecting discrete points x,y
 
-    Passes kwargs to ax.plot for the line.
+    Passes kwargs to ax.plot for the line. x and y may be chunked sources,
+    see handle_args.
+
+    Parameters
+    ----------
+    yerr
+        error bars for y, a scalar, array or 2xN array of lower, upper errors
+    fast : bool
+        draw the markers on the line itself and the error bars as a single
+        collection, which is much faster for large series. Markers are then
+        drawn with their line, so later series may cover them, and legend
+        entries show the marker
+    live : bool
+        return a LiveLine handle to update the line in place, drawn with the
+        fast path and without error bars
     """
     yerr = kwargs.pop('yerr', None)
+    fast = kwargs.pop('fast', False)
+    if kwargs.pop('live', False):
+        if yerr is not None:
+            raise ValueError('Live lines can not have error bars')
+        return LiveLine(_fast_line(x, y, ax, None, **kwargs)[0])
+    if fast:
+        return _fast_line(x, y, ax, yerr, **kwargs)
+
     lines = ax.plot(x, y, zorder=1, **kwargs)
     if yerr is not None:
         ax.errorbar(x, y,
@@ -47,27 +283,183 @@ def line(x, y, ax, **kwargs):
     return lines
 
 
+def _fast_line(x, y, ax, yerr, **kwargs):
+    """ Draw line with the halo and dot markers of a single Line2D
+
+    """
+    # Scatter strokes its markers with the patch line width, so the white
+    # halo and colored dot extend past their areas of 80 and 10 by half of it
+    edge = matplotlib.rcParams['patch.linewidth']
+    outer = (np.sqrt(80) + edge) / 2.0
+    inner = (np.sqrt(10) + edge) / 2.0
+
+    # The white edge is stroked centered on the edge of the colored face
+    lines = ax.plot(x, y, zorder=1,
+                    marker='o',
+                    markersize=outer + inner,
+                    markeredgewidth=outer - inner,
+                    markeredgecolor='white',
+                    **kwargs)
+    lines[0].set_markerfacecolor(lines[0].get_color())
+
+    if yerr is not None:
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        yerr = np.asarray(yerr, dtype=float)
+        lower, upper = (yerr if yerr.ndim == 2 else (yerr, yerr))
+        segments = np.empty((len(x), 2, 2))
+        segments[:, :, 0] = x[:, np.newaxis]
+        segments[:, 0, 1] = y - lower
+        segments[:, 1, 1] = y + upper
+        errors = LineCollection(segments,
+                                colors=lines[0].get_color(),
+                                linewidths=matplotlib.rcParams[
+                                    'lines.linewidth'],
+                                zorder=1)
+        ax.add_collection(errors)
+        ax.autoscale_view()
+    return lines
+
+
+class LiveLine(object):
+    """ Handle to update a line from line(..., live=True) in place
+
+    Appended points are drawn on top of what is already on the canvas and
+    only the axes are blitted, so a refresh costs time in the number of new
+    points. The whole figure is only redrawn if the new points leave the
+    current view, when the limits are also extended by headroom, or if the
+    canvas can not be drawn on incrementally.
+
+    Parameters
+    ----------
+    line
+        the Line2D to update
+    headroom : float
+        fraction of the view to add in the direction data leaves it
+    """
+
+    def __init__(self, line, headroom=0.2):
+        self.line = line
+        self.ax = line.axes
+        self.headroom = headroom
+        self._x = np.asarray(line.get_xdata(), dtype=float)
+        self._y = np.asarray(line.get_ydata(), dtype=float)
+        self._size = len(self._x)
+        self._drawn = False
+
+        # Draws only the newest segments, styled like the line
+        self._tail = matplotlib.lines.Line2D([], [])
+        self._tail.update_from(line)
+
+    def append(self, x, y):
+        """ Add points x, y (scalars or arrays) to the end of the line
+
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        start = max(self._size - 1, 0)
+        size = self._size + len(x)
+        if size > len(self._x):
+            # Grow geometrically so appending is amortized constant time
+            capacity = max(size, 2 * len(self._x), 16)
+            self._x = np.resize(self._x, capacity)
+            self._y = np.resize(self._y, capacity)
+        self._x[self._size:size] = x
+        self._y[self._size:size] = y
+        self._size = size
+        self.line.set_data(self._x[:size], self._y[:size])
+
+        if not (self._drawn and self._blits() and self._in_view(x, y)):
+            self._rescale()
+            self._redraw()
+            return
+
+        # The previous point is drawn again so its marker stays on top
+        self._tail.set_data(self._x[start:size], self._y[start:size])
+        canvas = self.ax.figure.canvas
+        self.ax.draw_artist(self._tail)
+        canvas.blit(self.ax.bbox)
+
+    def set_data(self, x, y):
+        """ Replace all of the data of the line
+
+        """
+        self._x = np.asarray(x, dtype=float).copy()
+        self._y = np.asarray(y, dtype=float).copy()
+        self._size = len(self._x)
+        self.line.set_data(self._x, self._y)
+        self._rescale()
+        self._redraw()
+
+    def _blits(self):
+        """ If the canvas can be drawn on incrementally, like Agg canvases
+
+        """
+        return hasattr(self.ax.figure.canvas, 'copy_from_bbox')
+
+    def _in_view(self, x, y):
+        """ If the points x, y are inside the current view, or can't change it
+
+        """
+        autoscale = self.ax.get_autoscalex_on() or self.ax.get_autoscaley_on()
+        if not len(x) or not autoscale:
+            return True
+        xmin, xmax = sorted(self.ax.get_xlim())
+        ymin, ymax = sorted(self.ax.get_ylim())
+        return (xmin <= x.min() and x.max() <= xmax
+                and ymin <= y.min() and y.max() <= ymax)
+
+    def _rescale(self):
+        """ Fit the view to the data, with headroom where it has grown
+
+        """
+        before = self.ax.viewLim.frozen()
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if not self._drawn or self.headroom <= 0:
+            return
+        for get, set_, low, high in ((self.ax.get_xlim, self.ax.set_xlim,
+                                      before.x0, before.x1),
+                                     (self.ax.get_ylim, self.ax.set_ylim,
+                                      before.y0, before.y1)):
+            lo, hi = get()
+            span = (hi - lo) * self.headroom
+            set_(lo - span if lo < low else lo,
+                 hi + span if hi > high else hi, auto=None)
+
+    def _redraw(self):
+        """ Draw the whole figure
+
+        """
+        canvas = self.ax.figure.canvas
+        canvas.draw()
+        canvas.blit(self.ax.figure.bbox)
+        self._drawn = True
+
+
 @handle_args
 def bar(labels, heights, ax, **kwargs):
     """ Draw bars with heights and corresponding labels
 
-    Passes kwargs to ax.bar
+    Passes kwargs to ax.bar, or to the PolyCollection with collection=True.
+    Tick labels are thinned out if there are more than fit on the axis.
+
+    Parameters
+    ----------
+    heights
+        a height for each label, or a 2D array with a row for each series
+    stacked : bool
+        stack the series of 2D heights instead of drawing them side by side
+    color
+        a color, or a list of them cycled over the bars like ax.bar, or over
+        the series of 2D heights
+    collection : bool
+        draw all bars as a single PolyCollection, which is much faster for
+        many bars, defaults to True for more than 500 bars
     """
     width = kwargs.pop('width', 0.36)
-    offset = kwargs.pop('offset', 0.0)
-    if 'color' in kwargs:
-        color = kwargs.pop('color')
-    else:
-        color = next_color()  # make sure not to advance iterator if not used
-
-    dummy = np.arange(0, len(labels)) + offset
-    bars = ax.bar(dummy,
-                  heights,
-                  width=width,
-                  color=color,
-                  linewidth=0,
-                  **kwargs)
-    setup_axes(ax, xticks=dummy + width/2.0, xticklabels=labels)
+    bars, ticks, labels = _bars(labels, heights, ax, width, True, kwargs)
+    setup_axes(ax, xticks=ticks, xticklabels=labels)
     ax.yaxis.set_major_locator(ticker.MaxNLocator(4))
     ax.grid(axis='y', color='white', ls='-', lw=1.2)
     ax.set_axisbelow(False)
@@ -79,25 +471,139 @@ def bar(labels, heights, ax, **kwargs):
 def barh(labels, widths, ax, **kwargs):
     """ Draw bars with widths and corresponding labels
 
-    Passes kwargs to ax.barh
+    Passes kwargs to ax.barh, or to the PolyCollection with collection=True.
+    Tick labels are thinned out if there are more than fit on the axis.
+
+    Parameters
+    ----------
+    widths
+        a width for each label, or a 2D array with a row for each series
+    stacked : bool
+        stack the series of 2D widths instead of drawing them side by side
+    color
+        a color, or a list of them cycled over the bars like ax.barh, or over
+        the series of 2D widths
+    collection : bool
+        draw all bars as a single PolyCollection, which is much faster for
+        many bars, defaults to True for more than 500 bars
     """
     height = kwargs.pop('height', 0.36)
+    bars, ticks, labels = _bars(labels, widths, ax, height, False, kwargs)
+    setup_axes(ax, yticks=ticks, yticklabels=labels)
+    ax.xaxis.set_major_locator(ticker.MaxNLocator(4))
+    ax.grid(axis='x', color='white', ls='-', lw=1.2)
+    ax.set_axisbelow(False)
+    ax.tick_params(axis='both', which='both', length=0)
+    return bars
+
+
+def _bars(labels, values, ax, size, vertical, kwargs):
+    """ Draw the bars for bar and barh
+
+    Returns the bars, tick locations and tick labels.
+    """
     offset = kwargs.pop('offset', 0.0)
+    stacked = kwargs.pop('stacked', False)
+    collection = kwargs.pop('collection', None)
+
+    values = np.asarray(values, dtype=float)
+    if values.ndim not in (1, 2) or values.shape[-1] != len(labels):
+        raise ValueError('Expected a value for each of the ' + str(len(labels))
+                         + ' labels, or a row of them for each series, got'
+                         ' shape ' + str(values.shape))
+    series = values.reshape(-1, len(labels))
     if 'color' in kwargs:
-        color = kwargs.pop('color')
+        colors = kwargs.pop('color')
+        if values.ndim == 1 or matplotlib.colors.is_color_like(colors):
+            colors = [colors] * len(series)
+        else:
+            colors = [colors[i % len(colors)] for i in range(len(series))]
     else:
-        color = next_color()  # make sure not to advance iterator if not used
+        # make sure not to advance iterator if not used
+        colors = [next_color() for _ in series]
 
     dummy = np.arange(0, len(labels)) + offset
-    bars = ax.barh(dummy,
-                   widths,
-                   height=height,
-                   color=color,
-                   linewidth=0,
-                   **kwargs)
-    setup_axes(ax, yticks=dummy + height/2.0, yticklabels=labels)
-    ax.xaxis.set_major_locator(ticker.MaxNLocator(4))
-    ax.grid(axis='x', color='white', ls='-', lw=1.2)
-    ax.set_axisbelow(False)
-    ax.tick_params(axis='both', which='both', length=0)
+    if stacked:
+        positions = np.tile(dummy, (len(series), 1))
+        bases = np.cumsum(series, axis=0) - series
+        groups = 1
+    else:
+        positions = dummy + size * np.arange(len(series))[:, np.newaxis]
+        bases = np.zeros_like(series)
+        groups = len(series)
+
+    if collection is None:
+        collection = series.size > _collection_bars
+    if collection:
+        bars = _bar_collection(ax, positions, series, bases, size,
+                               colors, vertical, kwargs)
+    else:
+        draw = ax.bar if vertical else ax.barh
+        base = 'bottom' if vertical else 'left'
+        bars = []
+        for pos, vals, bottom, color in zip(positions, series, bases, colors):
+            bars.append(draw(pos, vals, size,
+                             color=color, linewidth=0,
+                             **dict(kwargs, **{base: bottom})))
+        if values.ndim == 1:
+            bars = bars[0]
+
+    # Bars are centered on their positions, ticks on the middle of each group
+    ticks = dummy + (groups - 1) * size / 2.0
+    return (bars,) + _thin_ticks(ax, ticks, labels, vertical)
+
+
+def _bar_collection(ax, positions, lengths, bases, size, colors, vertical,
+                    kwargs):
+    """ Draw bars as a single PolyCollection
+
+    """
+    count = lengths.shape[-1]
+    positions = positions.ravel()
+    lengths = lengths.ravel()
+    bases = bases.ravel()
+
+    # Corners of each bar, in order along and then across the bar
+    verts = np.empty((len(positions), 4, 2))
+    across, along = (0, 1) if vertical else (1, 0)
+    verts[:, :, across] = (positions - size / 2.0)[:, np.newaxis]
+    verts[:, 2:, across] += size
+    verts[:, :, along] = bases[:, np.newaxis]
+    verts[:, 1:3, along] += lengths[:, np.newaxis]
+
+    facecolors = np.concatenate([_bar_colors(color, count)
+                                 for color in colors])
+    bars = PolyCollection(verts, facecolors=facecolors, linewidths=0,
+                          **kwargs)
+    # Bars start at zero without a margin, like ax.bar
+    sticky = bars.sticky_edges.y if vertical else bars.sticky_edges.x
+    sticky.append(0)
+    ax.add_collection(bars)
+    ax.autoscale_view()
     return bars
+
+
+def _bar_colors(color, count):
+    """ RGBA colors of count bars of one series
+
+    color is a single color, or a list cycled over the bars like ax.bar
+    """
+    if matplotlib.colors.is_color_like(color):
+        color = [color]
+    return np.resize(matplotlib.colors.to_rgba_array(color), (count, 4))
+
+
+def _thin_ticks(ax, ticks, labels, vertical):
+    """ Keep every nth tick so that the labels fit along the axis
+
+    """
+    axis = 'x' if vertical else 'y'
+    extent = ax.get_window_extent()
+    length = (extent.width if vertical else extent.height) * 72.0 / ax.figure.dpi
+    size = FontProperties(
+        size=matplotlib.rcParams[axis + 'tick.labelsize']).get_size_in_points()
+
+    # Labels stack along the axis with at least their line height
+    fits = max(1, int(length / (1.5 * size)))
+    step = int(np.ceil(len(labels) / float(fits)))
+    return ticks[::step], list(labels)[::step]
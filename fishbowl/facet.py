@@ -0,0 +1,157 @@
+"""
+facet - Grids of small multiples sharing their axes
+
+Panels of a facet grid share their x and y axes, so limits, scales, tick
+locators and formatters are set once for the whole grid rather than for
+every panel. The shared locators remember the ticks of the last view they
+were asked about, so tick layout is computed once per shared axis when the
+grid is drawn instead of once per panel.
+
+facets       - Create a figure with a grid of axes sharing x and y
+setup_facets - Apply the plot helper options to a whole grid at once
+"""
+
+import numpy as np
+import matplotlib.ticker as ticker
+
+from fishbowl import core
+
+
+class _SharedLocator(ticker.Locator):
+    """ Locator reusing the ticks of another for axes with the same view.
+
+    Shared axes share one locator, which matplotlib calls again for each of
+    them. The ticks only depend on the view limits and the size of the axes,
+    so they are computed for the first panel and reused for the others.
+    """
+
+    def __init__(self, locator):
+        self.locator = locator
+        self._key = None
+        self._ticks = None
+
+    def set_axis(self, axis):
+        self.axis = axis
+        self.locator.set_axis(axis)
+
+    def set_params(self, **kwargs):
+        self._key = None
+        self.locator.set_params(**kwargs)
+
+    def __call__(self):
+        vmin, vmax = self.axis.get_view_interval()
+        key = (vmin, vmax, tuple(self.axis.axes.bbox.size))
+        if key != self._key:
+            self._ticks = self.locator()
+            self._key = key
+        return self._ticks
+
+    def tick_values(self, vmin, vmax):
+        return self.locator.tick_values(vmin, vmax)
+
+    def view_limits(self, vmin, vmax):
+        return self.locator.view_limits(vmin, vmax)
+
+    def nonsingular(self, v0, v1):
+        return self.locator.nonsingular(v0, v1)
+
+
+def _share_locators(axis):
+    """ Wrap the locators of axis, and all axes sharing it, once.
+
+    """
+    # Wrapping is not a user choice, keep matplotlib's default flags
+    defaults = (axis.isDefault_majloc, axis.isDefault_minloc)
+    if not isinstance(axis.get_major_locator(), _SharedLocator):
+        axis.set_major_locator(_SharedLocator(axis.get_major_locator()))
+    if not isinstance(axis.get_minor_locator(), _SharedLocator):
+        axis.set_minor_locator(_SharedLocator(axis.get_minor_locator()))
+    axis.isDefault_majloc, axis.isDefault_minloc = defaults
+
+
+def facets(nrows, ncols, sharex=True, sharey=True, **kwargs):
+    """ Create a figure with a grid of axes sharing x and y.
+
+    The figure is created with the scoped style, see core.subplots.
+
+    Parameters
+    ----------
+    nrows : int
+        number of rows of panels
+    ncols : int
+        number of columns of panels
+    sharex, sharey : bool or str
+        share the axis between all panels, or 'row' or 'col'
+    kwargs
+        passed to matplotlib.pyplot.subplots, e.g. figsize
+
+    Returns
+    -------
+    the figure and a 2d array of its axes
+    """
+    return core.subplots(nrows, ncols, sharex=sharex, sharey=sharey,
+                         squeeze=False, **kwargs)
+
+
+def setup_facets(axes, **kwargs):
+    """ Apply the plot helper options to a grid of axes at once.
+
+    setup_axes is applied once for each group of panels sharing both axes,
+    which is once for the whole grid from facets. The title is placed above
+    the figure, axis labels only on the outer panels, and text and legend
+    on the first panel. Accepts the same kwargs as the plot helpers, others
+    are ignored.
+
+    Parameters
+    ----------
+    axes
+        2d array of axes, as returned by facets
+    """
+    from fishbowl.decorator import setup_axes, text, legend
+
+    axes = np.asarray(axes, dtype=object)
+    if axes.ndim < 2:
+        axes = axes.reshape(1, -1)
+    options = dict(kwargs)
+    title = options.pop('title', None)
+    xlabel = options.pop('xlabel', None)
+    ylabel = options.pop('ylabel', None)
+
+    configured = []
+    for ax in axes.flat:
+        if not any(ax.get_shared_x_axes().joined(ax, done)
+                   and ax.get_shared_y_axes().joined(ax, done)
+                   for done in configured):
+            setup_axes(ax, **options)
+            _share_locators(ax.xaxis)
+            _share_locators(ax.yaxis)
+            configured.append(ax)
+        else:
+            # Spines are not shared, they are cheap to move to the back
+            for spine in ax.spines.values():
+                spine.set_zorder(100)
+
+    # Tick label rotation is a property of each label, not of the locator
+    first = axes.flat[0]
+    if options.get('xticklabels') is not None or options.get('xticks'):
+        labels = first.xaxis.get_majorticklabels()
+        if labels:
+            for ax in axes[-1]:
+                ax.tick_params(axis='x', labelrotation=labels[0].get_rotation())
+    if options.get('yticklabels') is not None or options.get('yticks'):
+        labels = first.yaxis.get_majorticklabels()
+        if labels:
+            for ax in axes[:, 0]:
+                ax.tick_params(axis='y', labelrotation=labels[0].get_rotation())
+
+    if title is not None:
+        first.figure.suptitle(title)
+    if xlabel is not None:
+        for ax in axes[-1]:
+            ax.set_xlabel(xlabel)
+    if ylabel is not None:
+        for ax in axes[:, 0]:
+            ax.set_ylabel(ylabel)
+
+    text(first, **kwargs)
+    legend(first, **kwargs)
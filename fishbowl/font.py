@@ -1,19 +1,239 @@
 """
 font - Configurations for system fonts through latex
+
+Names which are not saved configurations are checked against an index of
+the installed fonts, built from fontconfig and matplotlib's font manager.
+The index is kept on disk with the mtimes of the font directories, which are
+checked again every few seconds. It is rebuilt when one of them changes,
+walking only the changed directories, so checking a name does not scan fonts
+or wait for a latex run to fail. Fonts which are not installed are replaced
+by the fallback chain.
+
+available     - Check if a font is installed
+set_fallback  - Set the fonts used in place of missing fonts
+rebuild_index - Scan the installed fonts again
 """
 
+import os
+import json
+import time
+import warnings
+import subprocess
+
+from fishbowl import base
 from fishbowl.base import loads_from_json, saves_to_json
 
+# Fonts tried in order in place of a missing font
+_fallback = ('Inconsolata', 'DejaVu Serif')
+
+# Seconds between checks of the font directories for changes
+_check_interval = 5.0
+
+# Installed fonts, {'fonts': lower case names, 'signature': {dir: mtime},
+# 'checked': time the directories were last checked}
+_index = None
+
+# Missing fonts which have already been warned about
+_warned = set()
+
+
+def _index_path():
+    """ Path of the on-disk font index.
+
+    """
+    path = os.environ.get('FISHBOWL_FONT_INDEX')
+    if path:
+        return path
+    import matplotlib
+    return os.path.join(matplotlib.get_cachedir(), 'fishbowl.fontindex.json')
+
+
+def _font_dirs():
+    """ Directories which fonts are installed into.
+
+    """
+    import matplotlib
+    dirs = ['/usr/share/fonts', '/usr/local/share/fonts',
+            '/Library/Fonts', '/System/Library/Fonts',
+            '~/.fonts', '~/.local/share/fonts', '~/Library/Fonts',
+            os.path.join(matplotlib.get_data_path(), 'fonts')]
+    if 'WINDIR' in os.environ:
+        dirs.append(os.path.join(os.environ['WINDIR'], 'Fonts'))
+    return [os.path.expanduser(path) for path in dirs]
+
+
+def _walk(top):
+    """ Modification times of top and all directories below it.
+
+    Adding or removing a font changes the mtime of the directory holding it.
+    """
+    signature = {}
+    for path, _, _ in os.walk(top):
+        try:
+            signature[path] = os.stat(path).st_mtime
+        except OSError:
+            pass
+    return signature
+
+
+def _dirs_signature():
+    """ Modification times of all font directories.
+
+    """
+    signature = {}
+    for top in _font_dirs():
+        signature.update(_walk(top))
+    return signature
+
+
+def _changed(signature):
+    """ Directories of signature which changed, and new font directories.
+
+    Only stats the directories, nothing is listed.
+    """
+    changed = []
+    for path, mtime in signature.items():
+        try:
+            if os.stat(path).st_mtime != mtime:
+                changed.append(path)
+        except OSError:
+            changed.append(path)
+    changed.extend(top for top in _font_dirs()
+                   if top not in signature and os.path.isdir(top))
+    return changed
+
+
+def _update_signature(signature, changed):
+    """ Signature with the changed directories walked again.
+
+    """
+    signature = dict((path, mtime) for path, mtime in signature.items()
+                     if not any(path == top or path.startswith(top + os.sep)
+                                for top in changed))
+    for top in changed:
+        signature.update(_walk(top))
+    return signature
+
+
+def _installed_fonts():
+    """ Names of the fonts known to fontconfig and matplotlib.
+
+    """
+    names = set()
+    try:
+        output = subprocess.check_output(['fc-list', ':', 'family'])
+    except (OSError, subprocess.CalledProcessError):
+        output = b''
+    for line in output.decode('utf-8', 'replace').splitlines():
+        # Fonts with several names list them separated by commas
+        names.update(family.strip() for family in line.split(','))
+
+    from matplotlib import font_manager
+    names.update(entry.name for entry in font_manager.fontManager.ttflist)
+    names.discard('')
+    return sorted(name.lower() for name in names)
+
+
+def rebuild_index():
+    """ Scan the installed fonts and save the index to disk.
+
+    Returns
+    -------
+    frozenset of the installed font names in lower case
+    """
+    return _rebuild(_dirs_signature())
+
+
+def _rebuild(signature):
+    """ Index the installed fonts with the directory signature.
+
+    """
+    global _index
+    path = _index_path()
+    fonts = _installed_fonts()
+    try:
+        with base.locked(path):
+            base.write_json(path, {'signature': sorted(signature.items()),
+                                   'fonts': fonts})
+    except (IOError, OSError):
+        # Without a writable cache the index is only kept in memory
+        pass
+    _index = {'fonts': frozenset(fonts), 'signature': signature,
+              'checked': time.time()}
+    return _index['fonts']
+
+
+def _fonts():
+    """ Installed font names, rebuilt when a font directory changes.
+
+    """
+    global _index
+    if _index is None:
+        try:
+            with open(_index_path(), 'r') as infile:
+                values = json.load(infile)
+        except (IOError, OSError, ValueError):
+            values = {}
+        signature = dict(values.get('signature') or [])
+        if not signature:
+            return rebuild_index()
+        _index = {'fonts': frozenset(values['fonts']),
+                  'signature': signature, 'checked': 0}
+
+    if time.time() - _index['checked'] > _check_interval:
+        changed = _changed(_index['signature'])
+        if changed:
+            return _rebuild(_update_signature(_index['signature'], changed))
+        _index['checked'] = time.time()
+    return _index['fonts']
+
+
+def available(name):
+    """ True if the font name is installed.
+
+    If no fonts could be found at all, every font is assumed to be available.
+    """
+    fonts = _fonts()
+    return not fonts or name.lower() in fonts
+
+
+def set_fallback(*names):
+    """ Set the fonts used in place of a font which is not installed.
+
+    The first installed font is used, the last is used if none are.
+    Styles compiled afterwards use the new fallback chain.
+    """
+    global _fallback
+    if not names:
+        raise ValueError('At least one fallback font is needed')
+    _fallback = tuple(names)
+
+
+def _resolve(name):
+    """ List of fonts for font.serif, the font or its fallbacks.
+
+    """
+    if available(name):
+        return [name]
+    chain = [fallback for fallback in _fallback if available(fallback)]
+    chain = chain or list(_fallback[-1:])
+    if name not in _warned:
+        _warned.add(name)
+        warnings.warn('Font "' + name + '" is not installed, using '
+                      + ', '.join(chain) + ' instead')
+    return chain
+
 
 @loads_from_json('fishbowl.font.json')
 def font(name, size=20):
     """ Return configuration for named font
 
-    If a saved font config is not found, assumes the named font is a system
-    font and attempts to use it through pgf and xelatex.
+    If a saved font config is not found, uses the named system font through
+    pgf and xelatex. Fonts which are not installed are replaced by the
+    fallback chain with a warning.
     """
     config = {'font.family': 'serif',
-              'font.serif': name,
+              'font.serif': _resolve(name),
               'font.size': size}
     return config
 
@@ -0,0 +1,346 @@
+"""
+output - Save one figure to several files
+
+The figure is drawn once with Agg into an RGBA buffer at the highest
+resolution requested, and every raster output is encoded from that buffer on
+a thread pool, resampled if it has a lower resolution, e.g. thumbnails.
+Vector outputs must draw the figure themselves, and figures can not be drawn
+from several threads at once, so they are written one after another on the
+same pool while the raster outputs encode.
+
+save_async draws everything on the calling thread instead, and only hands
+compressing and writing the files to a bounded background pool, so the next
+figure can be drawn while the previous one is written.
+
+save       - Save a figure to several files
+save_async - Draw a figure now and write its files in the background
+wait_async - Wait for all files being written in the background
+outputs    - Files described by the names returned from a plot function
+rasterized - Rasterize heavy artists in vector output within a with statement
+"""
+
+import io
+import os
+import sys
+import threading
+import multiprocessing
+
+import numpy as np
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from contextlib import contextmanager
+
+# Raster formats encoded from the shared buffer and their PIL names
+_raster = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'tif': 'TIFF',
+           'tiff': 'TIFF', 'webp': 'WEBP'}
+
+
+def outputs(names, formats=None):
+    """ List of (filename, dpi) for names returned by a plot function.
+
+    Parameters
+    ----------
+    names
+        a filename, or a list of filenames and (filename, dpi) pairs
+        dpi defaults to savefig.dpi and can make smaller thumbnails
+    formats
+        list of extensions, or a comma separated string, each filename
+        is written once in each format instead of its own
+    """
+    if isinstance(names, (str, tuple)):
+        names = [names]
+    if isinstance(formats, str):
+        formats = [fmt.strip() for fmt in formats.split(',') if fmt.strip()]
+
+    files = []
+    for entry in names:
+        name, dpi = entry if isinstance(entry, tuple) else (entry, None)
+        if formats:
+            root = os.path.splitext(name)[0]
+            files.extend((root + '.' + fmt.lstrip('.'), dpi)
+                         for fmt in formats)
+        else:
+            files.append((name, dpi))
+    return files
+
+
+def _format(name):
+    """ Format of the file name from its extension.
+
+    """
+    return os.path.splitext(name)[1][1:].lower()
+
+
+class _Buffer(io.RawIOBase):
+    """ File-like object keeping the RGBA buffer written by print_raw.
+
+    """
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.array = np.array(data, dtype=np.uint8)
+        return self.array.nbytes
+
+
+def _draw_buffer(fig, dpi):
+    """ RGBA image of the figure as it would be saved at dpi.
+
+    """
+    buf = _Buffer()
+    fig.savefig(buf, format='raw', dpi=dpi)
+    array = buf.array
+    if array.ndim == 1:
+        # Older matplotlib writes the buffer without its shape
+        width, height = fig.get_size_inches() * dpi
+        array = array.reshape(int(round(height)), int(round(width)), 4)
+    return array
+
+
+def _encode(array, name, scale, dpi):
+    """ Write the RGBA image to name, resized by scale.
+
+    """
+    image = Image.fromarray(array, 'RGBA')
+    if scale != 1:
+        size = (max(1, int(round(image.size[0] * scale))),
+                max(1, int(round(image.size[1] * scale))))
+        image = image.resize(size, getattr(Image, 'LANCZOS', None))
+    fmt = _raster[_format(name)]
+    if fmt == 'JPEG':
+        image = image.convert('RGB')
+    image.save(name, format=fmt, dpi=(dpi, dpi))
+
+
+def _save_vectors(fig, files):
+    """ Save the files which need their own draw of fig, one at a time.
+
+    """
+    for name, dpi in files:
+        fig.savefig(name, dpi=dpi)
+
+
+def _size(artist):
+    """ Number of vertices and markers drawn for a line or collection.
+
+    """
+    from matplotlib.lines import Line2D
+
+    if isinstance(artist, Line2D):
+        points = len(artist.get_xydata())
+        lines = artist.get_linestyle() not in ('None', ' ', '')
+        markers = artist.get_marker() not in (None, 'None', ' ', '')
+        return points * (lines + markers)
+    vertices = sum(len(path.vertices) for path in artist.get_paths())
+    offsets = len(artist.get_offsets())
+    # A single offset places the paths, more draw a marker for each
+    return vertices + (offsets if offsets > 1 else 0)
+
+
+@contextmanager
+def rasterized(fig, threshold):
+    """ Rasterize heavy lines and collections of fig within the context.
+
+    Artists drawing more than threshold vertices and markers are drawn as
+    images at the savefig dpi in vector output. Axes, text and legends stay
+    vector. Artists are restored when the context exits.
+
+    Parameters
+    ----------
+    fig
+        the matplotlib Figure
+    threshold : int
+        rasterize artists with more vertices and markers than this,
+        None does nothing
+    """
+    from matplotlib.lines import Line2D
+    from matplotlib.collections import Collection
+
+    changed = []
+    if threshold is not None:
+        for ax in fig.axes:
+            for artist in ax.get_children():
+                if (isinstance(artist, (Line2D, Collection))
+                        and not artist.get_rasterized()
+                        and _size(artist) > threshold):
+                    artist.set_rasterized(True)
+                    changed.append(artist)
+    try:
+        yield changed
+    finally:
+        for artist in changed:
+            artist.set_rasterized(False)
+
+
+def _files(fig, names, formats):
+    """ (filename, dpi) of each output, split into raster and vector files.
+
+    """
+    import matplotlib
+
+    default = matplotlib.rcParams['savefig.dpi']
+    if default == 'figure':
+        default = fig.dpi
+    files = [(name, dpi or default)
+             for name, dpi in outputs(names, formats)]
+    raster = [(name, dpi) for name, dpi in files
+              if Image is not None and _format(name) in _raster]
+    vector = [entry for entry in files if entry not in raster]
+    return files, raster, vector
+
+
+def _encode_jobs(fig, raster):
+    """ Draw the raster buffer, return the jobs encoding each raster file.
+
+    """
+    if not raster:
+        return []
+    dpi = max(dpi for _, dpi in raster)
+    array = _draw_buffer(fig, dpi)
+    return [(_encode, (array, name, float(out) / dpi, out))
+            for name, out in raster]
+
+
+def save(fig, names, formats=None, workers=None):
+    """ Save a figure to several files, drawing raster outputs once.
+
+    Parameters
+    ----------
+    fig
+        the matplotlib Figure
+    names
+        a filename, or a list of filenames and (filename, dpi) pairs
+    formats
+        list of extensions, or a comma separated string, to write each
+        filename in instead of its own extension
+    workers : int
+        number of threads, defaults to the number of cpus
+
+    Returns
+    -------
+    list of the filenames written
+    """
+    files, raster, vector = _files(fig, names, formats)
+    jobs = _encode_jobs(fig, raster)
+    if vector:
+        jobs.append((_save_vectors, (fig, vector)))
+
+    if ThreadPoolExecutor is None or len(jobs) < 2:
+        _run(jobs)
+    else:
+        workers = workers or multiprocessing.cpu_count()
+        with ThreadPoolExecutor(min(workers, len(jobs))) as pool:
+            futures = [pool.submit(job, *args) for job, args in jobs]
+            for future in futures:
+                future.result()
+    return [name for name, _ in files]
+
+
+def _run(jobs, result=None):
+    """ Run each (function, args) job in turn, then return result.
+
+    """
+    for job, args in jobs:
+        job(*args)
+    return result
+
+
+def _write(data, name):
+    """ Write bytes to the file name.
+
+    """
+    with open(name, 'wb') as outfile:
+        outfile.write(data)
+
+
+# Threads encoding and writing outputs of save_async, started when first used
+_async_workers = min(4, multiprocessing.cpu_count())
+_executor = None
+
+# Saves which may be pending at once, save_async blocks when all are taken
+_max_pending = 2 * _async_workers
+_slots = threading.BoundedSemaphore(_max_pending)
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _done(future):
+    """ Free the slot held by a finished save.
+
+    """
+    with _pending_lock:
+        _pending.discard(future)
+    _slots.release()
+
+
+def save_async(fig, names, formats=None, close=True):
+    """ Draw a figure now and write its files in the background.
+
+    The figure is drawn on the calling thread, raster outputs into one
+    buffer and vector outputs into memory, so it can be closed or reused
+    as soon as this returns. Compressing and writing the files happens on
+    a bounded pool of threads. If too many saves are pending, this blocks
+    until one of them finishes.
+
+    Parameters
+    ----------
+    fig
+        the matplotlib Figure
+    names
+        a filename, or a list of filenames and (filename, dpi) pairs
+    formats
+        list of extensions, or a comma separated string, to write each
+        filename in instead of its own extension
+    close : bool
+        close the figure in pyplot once it is drawn
+
+    Returns
+    -------
+    concurrent.futures.Future with the list of filenames written
+    """
+    global _executor
+    if ThreadPoolExecutor is None:
+        raise RuntimeError('save_async needs concurrent.futures')
+
+    _slots.acquire()
+    try:
+        files, raster, vector = _files(fig, names, formats)
+        jobs = _encode_jobs(fig, raster)
+        for name, dpi in vector:
+            data = io.BytesIO()
+            fig.savefig(data, format=_format(name) or None, dpi=dpi)
+            jobs.append((_write, (data.getvalue(), name)))
+        if close and 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close(fig)
+
+        with _pending_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(_async_workers)
+            future = _executor.submit(_run, jobs,
+                                      [name for name, _ in files])
+            _pending.add(future)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(_done)
+    return future
+
+
+def wait_async():
+    """ Wait for all pending save_async writes, raise the first error.
+
+    """
+    with _pending_lock:
+        futures = list(_pending)
+    for future in futures:
+        future.result()
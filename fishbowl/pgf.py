@@ -0,0 +1,182 @@
+"""
+pgf - Faster text layout for the pgf backend
+
+With the pgf backend every string drawn is measured by a running LaTeX
+process, and matplotlib keeps only the process for the last preamble. Once
+installed, text metrics are kept in a sqlite database shared by all processes
+and figures, keyed by the font configuration, font properties and string, so
+LaTeX is only asked about new text. The LaTeX processes which measure text
+are kept for the last few font configurations instead of only the last one.
+
+install     - Use the metrics cache for all pgf output
+uninstall   - Restore the matplotlib text metrics
+clear_cache - Drop all saved metrics
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+
+from collections import OrderedDict
+
+# rcParams which change the LaTeX preamble or the fonts text is set in
+_rc_keys = ('pgf.texsystem', 'pgf.rcfonts', 'pgf.preamble', 'font.family',
+            'font.serif', 'font.sans-serif', 'font.monospace')
+
+# Number of LaTeX processes kept for different font configurations
+_max_managers = 4
+
+# LaTeX processes measuring text, {preamble: LatexManager}
+_managers = OrderedDict()
+
+# Metrics in LaTeX points, {key: (width, height, descent)}
+_metrics = {}
+
+# Open database and the original method replaced by install
+_state = {'db': None, 'path': None, 'original': None}
+_lock = threading.Lock()
+
+
+def _db_path():
+    """ Path of the metrics database.
+
+    """
+    path = os.environ.get('FISHBOWL_PGF_CACHE')
+    if path:
+        return path
+    import matplotlib
+    return os.path.join(matplotlib.get_cachedir(), 'fishbowl.pgf.sqlite')
+
+
+def _db():
+    """ Connection to the metrics database, opened once per process.
+
+    """
+    if _state['db'] is None:
+        db = sqlite3.connect(_state['path'] or _db_path(),
+                             check_same_thread=False)
+        # Readers do not block the writer, several renders share the file
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('CREATE TABLE IF NOT EXISTS metrics (key TEXT PRIMARY KEY,'
+                   ' width REAL, height REAL, descent REAL)')
+        _state['db'] = db
+    return _state['db']
+
+
+def _key(text, prop):
+    """ Key for the metrics of text set with the font properties prop.
+
+    """
+    import matplotlib
+    rc = matplotlib.rcParams
+    config = tuple(str(rc[key]) for key in _rc_keys)
+    font = (tuple(prop.get_family()), prop.get_size_in_points(),
+            prop.get_style(), prop.get_weight(), prop.get_variant(),
+            prop.get_stretch())
+    key = repr((config, font, text)).encode('utf-8')
+    return hashlib.sha1(key).hexdigest()
+
+
+def _manager():
+    """ LaTeX process for the current font configuration.
+
+    """
+    from matplotlib.backends.backend_pgf import LatexManager
+
+    header = LatexManager._build_latex_header()
+    if header in _managers:
+        manager = _managers.pop(header)
+    else:
+        manager = LatexManager()
+        while len(_managers) >= _max_managers:
+            # Dropping a manager stops its process
+            _managers.popitem(last=False)
+    _managers[header] = manager
+    return manager
+
+
+def _lookup(text, prop):
+    """ Width, height and descent of text in LaTeX points.
+
+    """
+    key = _key(text, prop)
+    metrics = _metrics.get(key)
+    if metrics is not None:
+        return metrics
+
+    with _lock:
+        db = _db()
+        row = db.execute('SELECT width, height, descent FROM metrics '
+                         'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            row = _manager().get_width_height_descent(text, prop)
+            with db:
+                db.execute('INSERT OR REPLACE INTO metrics VALUES '
+                           '(?, ?, ?, ?)', (key,) + tuple(row))
+    _metrics[key] = tuple(row)
+    return _metrics[key]
+
+
+def _get_text_width_height_descent(self, s, prop, ismath):
+    """ Text metrics for RendererPgf, read from the metrics cache.
+
+    """
+    from matplotlib.backends.backend_pgf import mpl_pt_to_in
+    width, height, descent = _lookup(s, prop)
+    # Same scaling as matplotlib, which leaves a little space around text
+    factor = mpl_pt_to_in * self.dpi
+    return width * factor, height * factor, descent * factor
+
+
+def install(path=None):
+    """ Use the metrics cache for all text drawn with the pgf backend.
+
+    Parameters
+    ----------
+    path : str
+        sqlite database to keep the metrics in, defaults to
+        FISHBOWL_PGF_CACHE or a file in the matplotlib cache directory
+    """
+    from matplotlib.backends.backend_pgf import RendererPgf
+
+    with _lock:
+        if path != _state['path'] and _state['db'] is not None:
+            _state['db'].close()
+            _state['db'] = None
+            _metrics.clear()
+        _state['path'] = path
+        if _state['original'] is None:
+            _state['original'] = RendererPgf.get_text_width_height_descent
+            RendererPgf.get_text_width_height_descent = \
+                _get_text_width_height_descent
+
+
+def uninstall():
+    """ Measure text with matplotlib again.
+
+    LaTeX processes kept by fishbowl are stopped, saved metrics are kept.
+    """
+    from matplotlib.backends.backend_pgf import RendererPgf
+
+    with _lock:
+        if _state['original'] is not None:
+            RendererPgf.get_text_width_height_descent = _state['original']
+            _state['original'] = None
+        if _state['db'] is not None:
+            _state['db'].close()
+            _state['db'] = None
+        _managers.clear()
+        _metrics.clear()
+
+
+def clear_cache():
+    """ Drop all saved text metrics.
+
+    """
+    with _lock:
+        _metrics.clear()
+        db = _db()
+        with db:
+            db.execute('DELETE FROM metrics')
@@ -0,0 +1,218 @@
+"""
+profiling - Time spent in each phase of rendering a plot
+
+A Profiler passed to fishbowl.plot(profile=...) records wall time, cpu time
+and peak memory for each phase of every render: creating the figure, the
+plot function, each plot helper, drawing the canvas and saving. Setting the
+FISHBOWL_PROFILE environment variable to a file profiles every plot and
+appends the results to it as json lines, FISHBOWL_CPROFILE to a directory
+also dumps cProfile statistics for each render.
+
+Profiler - Profile renders and pass the results to logs and hooks
+Profile  - Phases recorded for one render
+Phase    - Measurements of one phase
+"""
+
+import os
+import json
+import time
+import threading
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+_wall = getattr(time, 'perf_counter', time.time)
+_cpu = getattr(time, 'process_time', None) or time.clock
+
+Phase = namedtuple('Phase', ['name', 'wall', 'cpu', 'peak_memory'])
+Phase.__doc__ = """ Measurements of one phase of a render
+
+wall and cpu are the seconds spent in the phase, peak_memory the peak of
+memory traced by tracemalloc in bytes, or None if memory is not tracked.
+Phases may be nested, the savefig phase includes the draw phase.
+"""
+
+# Running peaks of the active _traced_peak measurements, raised to the
+# traced peak before any of them resets it
+_peaks = []
+_peaks_lock = threading.Lock()
+
+
+@contextmanager
+def _traced_peak():
+    """ Measure the peak of memory traced by tracemalloc in the body.
+
+    Yields a list whose item is set to the peak in bytes on exit. The traced
+    peak is reset on entry, measurements enclosing this one keep the peak
+    reached before.
+    """
+    peak = [0]
+    with _peaks_lock:
+        if hasattr(tracemalloc, 'reset_peak'):
+            traced = tracemalloc.get_traced_memory()[1]
+            for other in _peaks:
+                other[0] = max(other[0], traced)
+            tracemalloc.reset_peak()
+        _peaks.append(peak)
+    try:
+        yield peak
+    finally:
+        with _peaks_lock:
+            del _peaks[next(index for index, other in enumerate(_peaks)
+                            if other is peak)]
+            peak[0] = max(peak[0], tracemalloc.get_traced_memory()[1])
+
+
+@contextmanager
+def no_phase(name):
+    """ Stand-in for Profile.phase when a render is not profiled.
+
+    """
+    yield
+
+
+class Profile(object):
+    """ Phases recorded for one render of a plot.
+
+    Attributes
+    ----------
+    plot : str
+        name of the plot function
+    output : str
+        file written by the render
+    phases : list
+        Phase for each phase, in the order they finished
+    """
+
+    def __init__(self, plot, memory=True):
+        self.plot = plot
+        self.output = None
+        self.phases = []
+        self._memory = memory and tracemalloc is not None
+
+    @contextmanager
+    def phase(self, name):
+        """ Record the time and memory spent in the body as a phase.
+
+        """
+        peak = [None]
+        wall, cpu = _wall(), _cpu()
+        try:
+            if self._memory:
+                with _traced_peak() as peak:
+                    yield
+            else:
+                yield
+        finally:
+            wall, cpu = _wall() - wall, _cpu() - cpu
+            self.phases.append(Phase(name, wall, cpu, peak[0]))
+
+    @contextmanager
+    def draws(self, fig):
+        """ Record each draw of fig within the body as a phase.
+
+        """
+        def draw(renderer):
+            with self.phase('draw'):
+                return type(fig).draw(fig, renderer)
+        fig.draw = draw
+        try:
+            yield
+        finally:
+            del fig.draw
+
+    def to_dict(self):
+        """ Dictionary of the profile which can be saved as json.
+
+        """
+        return {'plot': self.plot,
+                'output': self.output,
+                'phases': [phase._asdict() for phase in self.phases]}
+
+
+class Profiler(object):
+    """ Profile renders and pass the results to logs and hooks.
+
+    Parameters
+    ----------
+    log : str
+        file the profile of each render is appended to as a json line
+    cprofile : str
+        directory to dump cProfile statistics of each render into,
+        named after the output file
+    memory : bool
+        track peak memory with tracemalloc, which slows rendering down
+    hooks
+        functions called with the Profile of each render
+    """
+
+    def __init__(self, log=None, cprofile=None, memory=True, hooks=()):
+        self.log = log
+        self.cprofile = cprofile
+        self.memory = memory
+        self.hooks = list(hooks)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def render(self, plot):
+        """ Profile one render of the plot named plot, yields its Profile.
+
+        The results are logged and passed to the hooks once the render
+        finishes, even if it raises.
+        """
+        profile = Profile(plot, self.memory)
+        tracing = tracemalloc is not None and tracemalloc.is_tracing()
+        if profile._memory and not tracing:
+            tracemalloc.start()
+        profiler = None
+        if self.cprofile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield profile
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if profile._memory and not tracing:
+                tracemalloc.stop()
+            self._finish(profile, profiler)
+
+    def _finish(self, profile, profiler):
+        """ Write the profile to the log and cProfile dump, call the hooks.
+
+        """
+        if profiler is not None:
+            name = os.path.basename(profile.output or profile.plot)
+            profiler.dump_stats(os.path.join(self.cprofile, name + '.prof'))
+        if self.log:
+            line = json.dumps(profile.to_dict()) + '\n'
+            with self._lock:
+                with open(self.log, 'a') as outfile:
+                    outfile.write(line)
+        for hook in self.hooks:
+            hook(profile)
+
+
+# Profiler set up from the environment, (settings, profiler)
+_env = (None, None)
+
+
+def _env_profiler():
+    """ Profiler configured by FISHBOWL_PROFILE and FISHBOWL_CPROFILE.
+
+    Returns None if neither is set.
+    """
+    global _env
+    settings = (os.environ.get('FISHBOWL_PROFILE'),
+                os.environ.get('FISHBOWL_CPROFILE'))
+    if not any(settings):
+        return None
+    if _env[0] != settings:
+        _env = (settings, Profiler(log=settings[0], cprofile=settings[1]))
+    return _env[1]
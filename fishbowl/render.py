@@ -0,0 +1,212 @@
+"""
+render - Render many plots in parallel
+
+Fans jobs for functions decorated with fishbowl.plot out over a pool of
+worker processes. Each worker imports matplotlib, sets the style and warms
+the font caches once when it starts, then renders jobs until the pool is
+done. Large numpy arrays in the job arguments are passed to the workers
+through shared memory instead of being pickled with every job.
+
+render_many - Render a list of (plot, kwargs) jobs and return the results
+"""
+
+import sys
+import time
+import importlib
+import traceback
+import multiprocessing
+
+import numpy as np
+
+from collections import namedtuple
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+# Shared memory attached by this worker, {name: (block, array)}
+_attached = {}
+
+# Traceback of the error preparing this worker, returned for every job
+_init_error = None
+
+RenderResult = namedtuple('RenderResult', ['output', 'time', 'error'])
+RenderResult.__doc__ = """ Result of one job from render_many
+
+output is the file, or list of files, written by the job, time the wall time
+in seconds spent rendering it, and error the formatted traceback if the job
+raised.
+"""
+
+
+class _SharedArray(object):
+    """ Reference to a numpy array placed in shared memory.
+
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def attach(self):
+        """ Return a read only array view into the shared memory.
+
+        Blocks stay attached for the life of the worker, figures may keep
+        references to the array and other jobs can reuse it.
+        """
+        if self.name not in _attached:
+            shm = shared_memory.SharedMemory(name=self.name)
+            array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+            array.flags.writeable = False
+            _attached[self.name] = (shm, array)
+        return _attached[self.name][1]
+
+
+def _share(kwargs, blocks, min_bytes):
+    """ Replace large arrays in kwargs with shared memory references.
+
+    blocks maps the id of each shared array to its (array, block, reference)
+    so an array passed to several jobs is only copied once.
+    """
+    shared = {}
+    for key, value in kwargs.items():
+        if (shared_memory is not None and isinstance(value, np.ndarray)
+                and value.nbytes >= min_bytes):
+            if id(value) not in blocks:
+                shm = shared_memory.SharedMemory(create=True,
+                                                 size=value.nbytes)
+                view = np.ndarray(value.shape, dtype=value.dtype,
+                                  buffer=shm.buf)
+                view[...] = value
+                ref = _SharedArray(shm.name, value.shape, value.dtype.str)
+                blocks[id(value)] = (value, shm, ref)
+            value = blocks[id(value)][2]
+        shared[key] = value
+    return shared
+
+
+def _plot_name(plot):
+    """ Module and name to import the decorated plot function in workers.
+
+    """
+    # click commands keep the decorated function as their callback
+    target = getattr(plot, 'callback', plot)
+    if not hasattr(getattr(plot, '_render', None), '__call__'):
+        raise ValueError('Can only render functions decorated with '
+                         'fishbowl.plot, got ' + repr(plot))
+    return target.__module__, target.__name__
+
+
+def _init_worker(style, backend):
+    """ Prepare a worker process to render plots.
+
+    Errors are kept and returned for each job, the pool would start new
+    workers without end if this raised.
+    """
+    global _init_error
+    try:
+        _prepare_worker(style, backend)
+    except Exception:
+        _init_error = traceback.format_exc()
+
+
+def _prepare_worker(style, backend):
+    """ Set the backend and style, warm the font caches.
+
+    """
+    import matplotlib
+    if backend:
+        matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+    from fishbowl import core
+
+    core.set_style(style=style)
+
+    # Warm the font caches by resolving and drawing with the style fonts
+    families = matplotlib.rcParams['font.family']
+    for family in families:
+        # A bare string would be parsed as a fontconfig pattern
+        font_manager.findfont(font_manager.FontProperties(family=[family]))
+    fig = plt.figure()
+    fig.text(0.5, 0.5, 'fishbowl 0123456789')
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _run_job(job):
+    """ Render one job in a worker process.
+
+    """
+    module, name, kwargs = job
+    start = time.time()
+    if _init_error is not None:
+        return RenderResult(None, 0.0, _init_error)
+    try:
+        if module == '__main__' and '__mp_main__' in sys.modules:
+            module = '__mp_main__'
+        plot = getattr(importlib.import_module(module), name)
+        for key, value in kwargs.items():
+            if isinstance(value, _SharedArray):
+                kwargs[key] = value.attach()
+        output = plot._render(kwargs)
+        return RenderResult(output, time.time() - start, None)
+    except Exception:
+        return RenderResult(None, time.time() - start,
+                            traceback.format_exc())
+
+
+def render_many(jobs, workers=None, style=None, backend='agg',
+                share_bytes=2**20):
+    """ Render many plots over a pool of worker processes.
+
+    Parameters
+    ----------
+    jobs
+        iterable of (plot, kwargs) pairs, where plot is a module level
+        function decorated with fishbowl.plot and kwargs the options
+        it would be called with
+    workers : int
+        number of worker processes, defaults to the number of cpus
+    style : dict
+        style dictionary set in each worker, defaults to get_style()
+    backend : str
+        matplotlib backend used by the workers
+    share_bytes : int
+        numpy arrays at least this large are passed through shared memory
+
+    Returns
+    -------
+    list of RenderResult in the same order as jobs
+    Jobs which raise do not stop the others, their error is returned.
+    """
+    from fishbowl.core import get_style
+
+    if style is None:
+        style = get_style()
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    blocks = {}
+    try:
+        specs = []
+        for plot, kwargs in jobs:
+            module, name = _plot_name(plot)
+            specs.append((module, name,
+                          _share(kwargs or {}, blocks, share_bytes)))
+
+        pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                    initargs=(style, backend))
+        try:
+            chunksize = max(1, len(specs) // (4 * workers))
+            return list(pool.imap(_run_job, specs, chunksize))
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        for _, shm, _ in blocks.values():
+            shm.close()
+            shm.unlink()
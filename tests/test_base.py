@@ -0,0 +1,82 @@
+import os
+import json
+import threading
+import pytest
+from fishbowl import base
+
+
+def make_loader(path):
+    @base.loads_from_json(path)
+    def load(name):
+        pass
+    return load
+
+
+def test_cache_reuses_parsed_file(tmp_path):
+    path = str(tmp_path / 'config.json')
+    with open(path, 'w') as outfile:
+        json.dump({'a': {'x': 1}}, outfile)
+    load = make_loader(path)
+    assert load('a') == {'x': 1}
+    assert base._cache[os.path.realpath(path)][1] == {'a': {'x': 1}}
+
+    # Modifying a returned value does not leak into the cache
+    load('a')['x'] = 2
+    assert load('a') == {'x': 1}
+
+    # The cached value itself is shared and read-only
+    assert load._saved('a') is load._saved('a')
+    with pytest.raises(TypeError):
+        load._saved('a')['x'] = 2
+
+
+def test_cache_invalidated_on_change(tmp_path):
+    path = str(tmp_path / 'config.json')
+    with open(path, 'w') as outfile:
+        json.dump({'a': 1}, outfile)
+    load = make_loader(path)
+    assert load('a') == 1
+    with open(path, 'w') as outfile:
+        json.dump({'a': 1, 'b': 22}, outfile)
+    assert load('b') == 22
+
+
+def test_clear_cache(tmp_path):
+    path = str(tmp_path / 'config.json')
+    with open(path, 'w') as outfile:
+        json.dump({'a': 1}, outfile)
+    make_loader(path)('a')
+    base.clear_cache()
+    assert base._cache == {}
+
+
+def make_saver(path):
+    @base.saves_to_json(path)
+    def save(name, config):
+        return config
+    return save
+
+
+def test_batch_save_writes_once(tmp_path):
+    path = str(tmp_path / 'config.json')
+    save, load = make_saver(path), make_loader(path)
+    with base.batch_save():
+        for i in range(10):
+            save('a' + str(i), i)
+        assert load('a3') == 3
+        assert not os.path.exists(path)
+    with open(path) as infile:
+        assert len(json.load(infile)) == 10
+
+
+def test_concurrent_saves_keep_all_values(tmp_path):
+    path = str(tmp_path / 'config.json')
+    save = make_saver(path)
+    threads = [threading.Thread(target=save, args=('a' + str(i), i))
+               for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(path) as infile:
+        assert len(json.load(infile)) == 20
@@ -0,0 +1,63 @@
+import numpy as np
+import fishbowl.color
+
+
+def test_palette_image():
+    image = fishbowl.color._palette_image([['#ff0000', '#00ff00'],
+                                           ['#0000ff']], 2, 1, 'white')
+    assert image.shape == (8, 8, 3)
+    assert image.dtype == np.uint8
+    assert tuple(image[1, 1]) == (255, 0, 0)
+    assert tuple(image[1, 5]) == (0, 255, 0)
+    assert tuple(image[5, 1]) == (0, 0, 255)
+    assert tuple(image[5, 5]) == (255, 255, 255)
+    assert tuple(image[0, 0]) == (255, 255, 255)
+
+
+def test_palette_sheet():
+    fig = fishbowl.color.draw_palette_sheet(['goldfish', 'gourami'])
+    assert len(fig.images) == 1
+    assert fig.images[0].get_array().shape[0] == 2 * (20 + 4)
+
+
+def test_color_spaces_round_trip():
+    rgb = np.random.RandomState(0).rand(50, 3)
+    for space in ('lab', 'oklab'):
+        forward, backward = fishbowl.color._spaces[space]
+        assert np.allclose(backward(forward(rgb)), rgb)
+    colors = ['#6fa29f', '#e77c26', '#000000']
+    assert fishbowl.color.to_hex(fishbowl.color.to_rgb(colors)) == colors
+
+
+def test_generated_palette():
+    colors = fishbowl.color.palette('goldfish')['color.palette']
+    generated = fishbowl.color.palette('goldfish@7')['color.palette']
+    assert len(generated) == 7
+    assert generated[0] == colors[0] and generated[-1] == colors[-1]
+    assert generated[2] == colors[1]
+    reversed_ = fishbowl.color.palette('goldfish:reversed')['color.palette']
+    assert reversed_ == colors[::-1]
+
+
+def test_apply_cmap_matches_matplotlib():
+    import matplotlib.cm
+    from matplotlib.colors import Normalize
+    values = np.random.RandomState(0).rand(40, 30)
+    values[3, 4] = np.nan
+    image = fishbowl.color.apply_cmap(values, 'viridis')
+    mappable = matplotlib.cm.ScalarMappable(
+        Normalize(np.nanmin(values), np.nanmax(values)), 'viridis')
+    assert np.array_equal(image, mappable.to_rgba(values, bytes=True))
+
+
+def test_cmap_registers_once():
+    from matplotlib.colors import ListedColormap
+
+    class Palette(object):
+        name = 'fishbowl_test_cmap'
+        mpl_colormap = ListedColormap(['red', 'blue'], name=name)
+
+    for i in range(3):
+        assert fishbowl.color.cmap(Palette()) == {'image.cmap': Palette.name}
+    image = fishbowl.color.apply_cmap([0, 1], Palette())
+    assert image.tolist() == [[255, 0, 0, 255], [0, 0, 255, 255]]
@@ -0,0 +1,186 @@
+import numpy as np
+import pytest
+import matplotlib.pyplot as plt
+import fishbowl.draw
+
+from matplotlib.collections import LineCollection
+
+
+def test_fast_line():
+    fig, ax = plt.subplots()
+    x = np.arange(5000.0)
+    y = np.sin(x)
+    lines = fishbowl.draw.line(x, y, yerr=0.1, ax=ax, fast=True)
+    assert len(ax.lines) == 1
+    assert lines[0].get_markerfacecolor() == lines[0].get_color()
+    errors, = ax.collections
+    assert isinstance(errors, LineCollection)
+    assert len(errors.get_segments()) == 5000
+    assert ax.get_ylim()[1] > 1.05
+
+    # Large series look the same as small ones unless fast is asked for
+    lines = fishbowl.draw.line(x, y, ax=ax, label='slow')
+    assert lines[0].get_marker() == 'None'
+    assert min(c.get_zorder() for c in ax.collections[1:]) > 1
+    plt.close(fig)
+
+
+def test_downsample():
+    from fishbowl import decimate
+    x = np.arange(10**5, dtype=float)
+    y = np.random.randn(10**5)
+    for method in (decimate.minmax, decimate.lttb):
+        indices, edges = method(x, y, 500)
+        assert len(indices) <= 1002
+        assert indices[0] == 0 and indices[-1] == len(x) - 1
+    indices, edges = decimate.minmax(x, y, 500)
+    assert y.argmin() in indices and y.argmax() in indices
+    errors = decimate.envelope(y, 0.5, indices, edges)
+    assert np.isclose((y[indices] + errors[1]).max(), y.max() + 0.5)
+
+    fig, ax = plt.subplots()
+    lines = fishbowl.draw.line(x, y, yerr=0.5, ax=ax, downsample='lttb')
+    assert len(lines[0].get_xdata()) <= 2 * ax.get_window_extent().width
+    with pytest.raises(ValueError):
+        fishbowl.draw.line(x, y, ax=ax, downsample=True, downsample_to=1)
+    plt.close(fig)
+
+
+def test_minmax_buckets_x():
+    from fishbowl import decimate
+    # Most points are crowded into the first percent of the range
+    x = np.concatenate([np.linspace(0, 1, 99000), np.linspace(1.1, 100, 1000)])
+    y = np.random.randn(len(x))
+    indices, edges = decimate.minmax(x, y, 100)
+    # Each bucket covers about a hundredth of the range of x
+    assert np.all(np.diff(x[edges[:-1]]) < 1.5)
+    buckets = np.split(np.arange(len(x)), edges[1:-1])
+    for bucket in buckets:
+        assert y[bucket].argmin() + bucket[0] in indices
+        assert y[bucket].argmax() + bucket[0] in indices
+
+
+def test_bar_collection():
+    from matplotlib.collections import PolyCollection
+    fig, ax = plt.subplots()
+    labels = ['L' + str(i) for i in range(5000)]
+    heights = np.random.rand(2, 5000)
+    bars = fishbowl.draw.bar(labels, heights, ax=ax, stacked=True)
+    assert isinstance(bars, PolyCollection)
+    assert len(bars.get_paths()) == 10000
+    assert len(ax.get_xticklabels()) < 100
+    assert ax.get_ylim()[1] >= heights.sum(axis=0).max()
+    plt.close(fig)
+
+
+def test_bar_series():
+    fig, ax = plt.subplots()
+    bars = fishbowl.draw.barh(['a', 'b', 'c'], [[1, 2, 3], [3, 2, 1]], ax=ax)
+    assert len(bars) == 2
+    assert [label.get_text() for label in ax.get_yticklabels()] == \
+        ['a', 'b', 'c']
+    # Ticks are centered on each group of bars
+    centers = [(bars[0][i].get_y() + bars[1][i].get_y()
+                + bars[1][i].get_height()) / 2 for i in range(3)]
+    assert np.allclose(ax.get_yticks(), centers)
+    with pytest.raises(ValueError):
+        fishbowl.draw.bar(['a', 'b', 'c'], [1, 2, 3, 4, 5, 6], ax=ax)
+    plt.close(fig)
+
+
+def test_bar_colors():
+    from matplotlib.colors import to_rgba
+    colors = ['red', 'blue']
+    for n in (5, 1000):
+        fig, ax = plt.subplots()
+        labels = ['L' + str(i) for i in range(n)]
+        bars = fishbowl.draw.bar(labels, np.ones(n), ax=ax, color=colors)
+        if n == 5:
+            faces = [bar.get_facecolor() for bar in bars]
+        else:
+            faces = [tuple(face) for face in bars.get_facecolors()]
+        assert faces[:3] == [to_rgba('red'), to_rgba('blue'), to_rgba('red')]
+        plt.close(fig)
+
+    # With 2D values the colors are cycled over the series in both paths
+    for collection in (False, True):
+        fig, ax = plt.subplots()
+        bars = fishbowl.draw.bar(['a', 'b', 'c'], np.ones((3, 3)), ax=ax,
+                                 color=colors, collection=collection)
+        if collection:
+            faces = [tuple(face) for face in bars.get_facecolors()[::3]]
+        else:
+            faces = [series[0].get_facecolor() for series in bars]
+        assert faces == [to_rgba('red'), to_rgba('blue'), to_rgba('red')]
+        plt.close(fig)
+
+
+def test_live_line():
+    fig, ax = plt.subplots()
+    live = fishbowl.draw.line([0, 1], [0, 1], ax=ax, live=True)
+    for i in range(2, 100):
+        live.append(i, i % 7)
+    live.append([100, 101], [3, 4])
+    assert len(live.line.get_xdata()) == 102
+    assert ax.get_xlim()[1] >= 101
+    live.set_data([0, 1, 2], [2, 1, 0])
+    assert list(live.line.get_ydata()) == [2, 1, 0]
+    plt.close(fig)
+
+
+def test_columns(tmp_path):
+    fig, ax = plt.subplots()
+    table = np.zeros(100, dtype=[('x', float), ('y', float), ('n', int)])
+    table['x'] = np.arange(100)
+    table['y'] = np.sin(table['x'])
+    lines = fishbowl.draw.line('x', 'y', data=table, ax=ax)
+    assert np.array_equal(lines[0].get_ydata(), table['y'])
+
+    path = str(tmp_path / 'y.npy')
+    np.save(path, table['y'])
+    column = fishbowl.draw._column(path)
+    assert isinstance(column, np.memmap)
+    assert fishbowl.draw._column(table['y']) is not None
+    plt.close(fig)
+
+
+def test_numeric_string_labels():
+    fig, ax = plt.subplots()
+    labels = np.array(['2019', '2020', '2021'], dtype=object)
+    bars = fishbowl.draw.bar(labels, [1, 2, 3], ax=ax)
+    assert len(bars) == 3
+    assert [label.get_text() for label in ax.get_xticklabels()] == \
+        ['2019', '2020', '2021']
+    plt.close(fig)
+
+
+def test_chunked_line(tmp_path, monkeypatch):
+    import tracemalloc
+    monkeypatch.setattr(fishbowl.draw, '_chunk_points', 10**5)
+    size = 10**6
+    path = str(tmp_path / 'y.npy')
+    np.save(path, np.random.randn(size))
+    x = np.arange(size, dtype=float)
+
+    fig, ax = plt.subplots()
+    tracemalloc.start()
+    lines = fishbowl.draw.line(x, path, yerr=0.5, ax=ax, downsample=True,
+                               downsample_to=500)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # Only a few chunks of the 8MB series are held in memory at once
+    assert peak < 4 * 10**6
+    # minmax also keeps the first and last points of the series
+    assert len(lines[0].get_xdata()) <= 504
+    y = np.load(path)
+    assert y.max() in lines[0].get_ydata()
+
+    chunks = (np.arange(i, i + 1000.0) for i in range(0, 10**4, 1000))
+    lines = fishbowl.draw.line(chunks, np.ones(10**4), ax=ax,
+                               downsample=True, downsample_to=100)
+    assert len(lines[0].get_xdata()) <= 104
+
+    # Without downsample memory maps are drawn in full
+    lines = fishbowl.draw.line(x, path, ax=ax)
+    assert len(lines[0].get_xdata()) == size
+    plt.close(fig)
@@ -0,0 +1,49 @@
+import os
+import matplotlib.pyplot as plt
+import fishbowl
+from fishbowl import facet
+
+
+def test_setup_facets():
+    fig, axes = fishbowl.facets(3, 4)
+    assert axes.shape == (3, 4)
+    for i, ax in enumerate(axes.flat):
+        ax.plot([0, 1, 2], [i, 2 * i, i], label='line')
+    facet.setup_facets(axes, title='Grid', xlabel='x', ylabel='y', ymax=30,
+                       ypercent=True, legend='upper right')
+
+    # Limits, locators and formatters are shared by every panel
+    locator = axes[0, 0].yaxis.get_major_locator()
+    assert isinstance(locator, facet._SharedLocator)
+    assert all(ax.yaxis.get_major_locator() is locator for ax in axes.flat)
+    assert all(ax.get_ylim()[1] == 30 for ax in axes.flat)
+    assert fig._suptitle.get_text() == 'Grid'
+    assert [ax.get_xlabel() for ax in axes[:, 0]] == ['', '', 'x']
+    assert [ax.get_ylabel() for ax in axes[0]] == ['y', '', '', '']
+    assert axes[0, 0].get_legend() is not None
+    assert axes[1, 1].get_legend() is None
+
+    # Ticks are computed by the first panel and reused by the others
+    fig.canvas.draw()
+    calls = []
+    compute = locator.locator.__call__
+    locator.locator = type('Counted', (), {
+        '__call__': lambda self: calls.append(1) or compute()})()
+    locator._key = None
+    fig.canvas.draw()
+    assert len(calls) == 1
+    plt.close(fig)
+
+
+def test_plot_facets(tmp_path):
+    name = str(tmp_path / 'grid.png')
+
+    @fishbowl.plot(facets=(2, 3))
+    def grid(fig, axes, **kwargs):
+        for ax in axes.flat:
+            ax.plot([1, 3, 2])
+        return name
+
+    assert grid._render({'xlabel': 'x', 'text': 'Panels'}) == name
+    assert os.path.exists(name)
+    assert plt.get_fignums() == []
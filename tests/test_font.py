@@ -0,0 +1,63 @@
+import os
+import json
+import warnings
+from fishbowl import font
+
+
+def use_index(monkeypatch, tmp_path):
+    path = str(tmp_path / 'index.json')
+    monkeypatch.setenv('FISHBOWL_FONT_INDEX', path)
+    monkeypatch.setattr(font, '_index', None)
+    return path
+
+
+def test_index_saved_and_reused(monkeypatch, tmp_path):
+    path = use_index(monkeypatch, tmp_path)
+    assert font.available('DejaVu Serif')
+    with open(path) as infile:
+        assert 'dejavu serif' in json.load(infile)['fonts']
+
+    # A valid index on disk is read without scanning the fonts again
+    monkeypatch.setattr(font, '_index', None)
+    monkeypatch.setattr(font, '_installed_fonts', lambda: 1 / 0)
+    assert font.available('dejavu serif')
+
+
+def test_index_rebuilt_when_fonts_change(monkeypatch, tmp_path):
+    path = use_index(monkeypatch, tmp_path)
+    font.available('DejaVu Serif')
+    with open(path) as infile:
+        values = json.load(infile)
+    values['signature'] = []
+    values['fonts'] = ['stale font']
+    with open(path, 'w') as outfile:
+        json.dump(values, outfile)
+    monkeypatch.setattr(font, '_index', None)
+    assert not font.available('stale font')
+
+
+def test_new_fonts_are_seen(monkeypatch, tmp_path):
+    use_index(monkeypatch, tmp_path)
+    fonts = tmp_path / 'fonts'
+    os.mkdir(str(fonts))
+    monkeypatch.setattr(font, '_font_dirs', lambda: [str(fonts)])
+    monkeypatch.setattr(font, '_installed_fonts', lambda: ['old font'])
+    assert font.available('old font') and not font.available('new font')
+
+    # Directories are only checked again after the interval
+    monkeypatch.setattr(font, '_installed_fonts', lambda: ['new font'])
+    os.mkdir(str(fonts / 'new'))
+    assert not font.available('new font')
+    monkeypatch.setattr(font, '_check_interval', 0)
+    assert font.available('new font')
+    assert str(fonts / 'new') in font._index['signature']
+
+
+def test_missing_font_uses_fallback(monkeypatch, tmp_path):
+    use_index(monkeypatch, tmp_path)
+    monkeypatch.setattr(font, '_fallback', ('Missing Font', 'DejaVu Serif'))
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        assert font.font('Not A Font')['font.serif'] == ['DejaVu Serif']
+        font.font('Not A Font')
+    assert len(caught) == 1
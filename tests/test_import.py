@@ -0,0 +1,30 @@
+import sys
+import subprocess
+
+
+def imported_modules(code):
+    """ Modules imported by running code in a fresh interpreter """
+    out = subprocess.check_output(
+        [sys.executable, '-c',
+         code + '\nimport sys\nprint(" ".join(sys.modules))'])
+    return set(out.decode().split())
+
+
+def test_import_is_lazy():
+    modules = imported_modules('import fishbowl')
+    assert 'matplotlib' not in modules
+    assert 'numpy' not in modules
+
+
+def test_decorate_is_lazy():
+    modules = imported_modules('import fishbowl\n'
+                               '@fishbowl.plot\n'
+                               'def example(fig, ax, **kwargs):\n'
+                               '    return "example.png"')
+    assert 'matplotlib' not in modules
+
+
+def test_set_style_skips_pyplot():
+    modules = imported_modules('import fishbowl\nfishbowl.set_style()')
+    assert 'matplotlib' in modules
+    assert 'matplotlib.pyplot' not in modules
@@ -0,0 +1,42 @@
+import os
+import matplotlib.pyplot as plt
+import fishbowl
+from fishbowl import output
+
+
+def test_outputs():
+    assert output.outputs('a.png') == [('a.png', None)]
+    assert output.outputs(['a.png', ('b.png', 20)], 'pdf, svg') == [
+        ('a.pdf', None), ('a.svg', None), ('b.pdf', 20), ('b.svg', 20)]
+
+
+def test_save_async(tmp_path):
+    futures = []
+    for i in range(3 * output._max_pending):
+        fig, ax = plt.subplots()
+        ax.plot([1, i])
+        names = [str(tmp_path / (str(i) + '.png')),
+                 str(tmp_path / (str(i) + '.pdf'))]
+        futures.append(fishbowl.save_async(fig, names))
+        # The figure is drawn and closed before save_async returns
+        assert not plt.fignum_exists(fig.number)
+    output.wait_async()
+    assert all(future.done() for future in futures)
+    assert len(os.listdir(str(tmp_path))) == 6 * output._max_pending
+    assert futures[0].result() == [str(tmp_path / '0.png'),
+                                   str(tmp_path / '0.pdf')]
+    assert output._slots.acquire(False)
+    output._slots.release()
+
+
+def test_rasterized():
+    fig, ax = plt.subplots()
+    heavy, = ax.plot(range(1000), 'o-')
+    light, = ax.plot(range(10))
+    scatter = ax.scatter(range(1200), range(1200))
+    with output.rasterized(fig, 1000) as changed:
+        assert changed == [heavy, scatter]
+        assert heavy.get_rasterized() and scatter.get_rasterized()
+        assert not light.get_rasterized()
+    assert not heavy.get_rasterized()
+    plt.close(fig)
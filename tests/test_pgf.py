@@ -0,0 +1,37 @@
+import io
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.backends.backend_pgf import RendererPgf
+from fishbowl import pgf
+
+
+class Manager(object):
+    calls = 0
+
+    def get_width_height_descent(self, text, prop):
+        Manager.calls += 1
+        return len(text), 10., 2.
+
+
+def test_metrics_cached_on_disk(monkeypatch, tmp_path):
+    monkeypatch.setattr(pgf, '_manager', Manager)
+    pgf.install(str(tmp_path / 'metrics.sqlite'))
+    try:
+        renderer = RendererPgf(Figure(dpi=72), io.StringIO())
+        prop = FontProperties(size=12)
+        first = renderer.get_text_width_height_descent('fish', prop, False)
+        assert first == (4., 10., 2.)
+        renderer.get_text_width_height_descent('fish', prop, False)
+        assert Manager.calls == 1
+
+        # Without the in-process cache metrics are read from the database
+        pgf._metrics.clear()
+        renderer.get_text_width_height_descent('fish', prop, False)
+        assert Manager.calls == 1
+        renderer.get_text_width_height_descent('fish', FontProperties(size=9),
+                                               False)
+        assert Manager.calls == 2
+    finally:
+        pgf.uninstall()
+    assert (RendererPgf.get_text_width_height_descent
+            is not pgf._get_text_width_height_descent)
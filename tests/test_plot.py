@@ -55,6 +55,198 @@ def test_plot(plot, expected):
     os.remove(expected)
 
 
+@fishbowl.plot(reuse=True, track_memory=True)
+def pooled(fig, ax, **kwargs):
+    x = np.linspace(2, 28, 10)
+    fishbowl.draw.line(x, np.random.rand(10))
+    return 'pooled.png'
+
+
+def test_figures_closed():
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    invoke(simple)
+    assert plt.get_fignums() == []
+    os.remove('simple.png')
+
+
+def test_reuse():
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    for i in range(3):
+        invoke(pooled)
+        assert len(pooled.last_render['output']) > 0
+        assert pooled.last_render['peak_memory'] > 0
+    assert plt.get_fignums() == []
+    os.remove('pooled.png')
+
+
+def test_cli_options_match_docstrings():
+    import itertools
+    import pydoc
+    from fishbowl.decorator import _plot_helper, _cli_options
+    options = []
+    lines = itertools.chain(*(f.__doc__.split("\n")
+                              for f in _plot_helper._functions))
+    lines1, lines2 = itertools.tee(lines)
+    next(lines2, None)
+    for line1, line2 in zip(lines1, lines2):
+        if ':' in line1:
+            opt, t = [s.strip() for s in line1.split(":")]
+            options.append((opt, pydoc.locate(t), line2.strip()))
+    assert tuple(options) == _cli_options
+
+
+def test_cache(tmp_path, monkeypatch):
+    from fishbowl.cache import RenderCache
+    monkeypatch.chdir(tmp_path)
+    data = tmp_path / 'data.txt'
+    data.write_text(u'1 2 3')
+    cache = RenderCache(str(tmp_path / 'renders.sqlite'))
+    calls = []
+
+    @fishbowl.plot(cache=cache, inputs=[str(data)])
+    def cached(fig, ax, **kwargs):
+        calls.append(kwargs)
+        ax.plot(np.loadtxt(str(data)))
+        return 'cached.png'
+
+    invoke(cached)
+    invoke(cached)
+    assert len(calls) == 1
+    assert cached.last_render == {'output': 'cached.png', 'cached': True}
+
+    data.write_text(u'1 2 3 4')
+    invoke(cached)
+    assert len(calls) == 2
+    with fishbowl.style(palette='gourami'):
+        invoke(cached)
+    assert len(calls) == 3
+
+    assert len(cache.entries()) == 3
+    assert cache.evict(older_than=3600) == 0
+    assert cache.evict(remove_outputs=True) == 3
+    assert cache.entries() == []
+    assert not os.path.exists('cached.png')
+
+
+def test_cache_paths(tmp_path, monkeypatch):
+    from fishbowl.cache import RenderCache
+    cache = RenderCache(str(tmp_path / 'renders.sqlite'))
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.mkdir()
+    second.mkdir()
+    monkeypatch.chdir(str(first))
+    calls = []
+
+    @fishbowl.plot(cache=cache)
+    def relative(fig, ax, **kwargs):
+        calls.append(kwargs)
+        return 'relative.png'
+
+    relative._render({})
+    relative._render({})
+    assert len(calls) == 1
+    # The same relative output in another directory is rendered there
+    monkeypatch.chdir(str(second))
+    relative._render({})
+    assert len(calls) == 2
+    assert os.path.exists(str(second / 'relative.png'))
+
+
+def test_profile(tmp_path, monkeypatch):
+    import json
+    log = str(tmp_path / 'profile.jsonl')
+    monkeypatch.setenv('FISHBOWL_PROFILE', log)
+    profiles = []
+
+    @fishbowl.plot(profile=profiles.append)
+    def hooked(fig, ax, **kwargs):
+        ax.plot([1, 2, 3])
+        return str(tmp_path / 'hooked.png')
+
+    @fishbowl.plot
+    def logged(fig, ax, **kwargs):
+        return str(tmp_path / 'logged.png')
+
+    invoke(hooked)
+    names = [phase.name for phase in profiles[0].phases]
+    assert names == ['figure', 'plot', 'setup_axes', 'text', 'legend',
+                     'draw', 'savefig']
+    assert hooked.last_render['profile'] is profiles[0]
+    assert all(phase.wall >= 0 for phase in profiles[0].phases)
+
+    invoke(logged)
+    with open(log) as infile:
+        lines = [json.loads(line) for line in infile]
+    assert [line['plot'] for line in lines] == ['logged']
+    assert lines[0]['phases'][-1]['name'] == 'savefig'
+
+
+def test_profile_keeps_peak_memory(tmp_path):
+    profiles = []
+
+    @fishbowl.plot(track_memory=True, profile=profiles.append)
+    def large(fig, ax, **kwargs):
+        temporary = np.ones(5 * 10**6)
+        ax.plot(temporary[:3])
+        return str(tmp_path / 'large.png')
+
+    invoke(large)
+    # Later phases reset the traced peak, the render keeps the highest
+    assert large.last_render['peak_memory'] >= 4 * 10**7
+    plot_phase = [phase for phase in profiles[0].phases
+                  if phase.name == 'plot'][0]
+    assert plot_phase.peak_memory >= 4 * 10**7
+    assert profiles[0].phases[-1].peak_memory < 4 * 10**7
+
+
+def test_formats(tmp_path):
+    from PIL import Image
+    root = str(tmp_path / 'many')
+
+    @fishbowl.plot
+    def many(fig, ax, **kwargs):
+        ax.plot([1, 3, 2])
+        return [root + '.png', (root + '_thumb.png', 10)]
+
+    assert many._render({}) == [root + '.png', root + '_thumb.png']
+    full = Image.open(root + '.png').size
+    assert Image.open(root + '_thumb.png').size[0] < full[0]
+
+    outputs = many._render({'formats': 'pdf,svg'})
+    assert outputs == [root + '.pdf', root + '.svg',
+                       root + '_thumb.pdf', root + '_thumb.svg']
+    assert all(os.path.exists(name) for name in outputs)
+
+
+def test_asynchronous(tmp_path):
+    import matplotlib.pyplot as plt
+    name = str(tmp_path / 'background.png')
+
+    @fishbowl.plot(asynchronous=True)
+    def background(fig, ax, **kwargs):
+        ax.plot([1, 3, 2])
+        return name
+
+    assert background._render({}) == name
+    assert background.last_render['future'].result() == [name]
+    assert os.path.exists(name)
+    assert plt.get_fignums() == []
+
+
+def invoke(plot):
+    try:
+        import click
+    except ImportError:
+        click = None
+    if click:
+        ctx = click.Context(plot)
+        ctx.invoke(plot)
+    else:
+        plot()
+
+
 def save_plots(*plots):
     try:
         import click
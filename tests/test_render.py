@@ -0,0 +1,30 @@
+import os
+import fishbowl
+import numpy as np
+
+
+@fishbowl.plot
+def series(fig, ax, **kwargs):
+    ax.plot(kwargs['x'], kwargs['y'])
+    return kwargs['name']
+
+
+def test_render_many(tmp_path):
+    fishbowl.reset_style()
+    x = np.linspace(0, 1, 2**18)
+    names = [str(tmp_path / ('series' + str(i) + '.png')) for i in range(4)]
+    jobs = [(series, {'x': x, 'y': x * i, 'name': name})
+            for i, name in enumerate(names)]
+    jobs.append((series, {'x': x}))
+    results = fishbowl.render_many(jobs, workers=2)
+    assert [r.output for r in results[:4]] == names
+    assert all(os.path.exists(name) for name in names)
+    assert results[4].error is not None
+
+
+def test_worker_errors_are_returned(tmp_path):
+    name = str(tmp_path / 'series.png')
+    jobs = [(series, {'x': [0, 1], 'y': [0, 1], 'name': name})]
+    results = fishbowl.render_many(jobs, workers=1, backend='no-backend')
+    assert results[0].output is None
+    assert 'no-backend' in results[0].error
@@ -1,11 +1,25 @@
+import pytest
 import matplotlib
 import fishbowl
+from fishbowl import core, font
 
 
 original = True
 updated = False
 
 
+@pytest.fixture(autouse=True)
+def use_index(monkeypatch, tmp_path):
+    # Fonts are resolved against a temporary index of known fonts, so the
+    # fallback for 'Arbitrary' does not depend on the installed fonts
+    monkeypatch.setenv('FISHBOWL_FONT_INDEX', str(tmp_path / 'index.json'))
+    monkeypatch.setattr(font, '_index', None)
+    monkeypatch.setattr(font, '_font_dirs', lambda: [])
+    monkeypatch.setattr(font, '_installed_fonts', lambda: ['dejavu serif'])
+    monkeypatch.setattr(font, '_fallback', ('Inconsolata', 'DejaVu Serif'))
+    monkeypatch.setattr(core, '_compiled', {})
+
+
 def test_context_set():
     fishbowl.reset_style()
     with fishbowl.style(axes='minimal', palette='gourami', font='Arbitrary'):
@@ -29,3 +43,164 @@ def test_reset():
     fishbowl.set_style(font='Arbitrary')
     fishbowl.reset_style()
     assert matplotlib.rcParams['axes.spines.left'] == original
+
+
+def test_compile_style():
+    bundle = fishbowl.compile_style(palette='gourami', font='Arbitrary')
+    assert fishbowl.compile_style(palette='gourami', font='Arbitrary') is bundle
+    assert bundle['axes.spines.left'] == updated
+    fishbowl.reset_style()
+    bundle.apply()
+    assert matplotlib.rcParams['axes.spines.left'] == updated
+    assert matplotlib.rcParams['font.serif'] == ['DejaVu Serif']
+
+    # Values handed out can not change the bundle
+    assert bundle['font.serif'] == ('DejaVu Serif',)
+    matplotlib.rcParams['font.serif'].append('Other')
+    bundle['axes.prop_cycle'].change_key('color', 'c')
+    assert bundle['font.serif'] == ('DejaVu Serif',)
+    assert bundle['axes.prop_cycle'].keys == {'color'}
+    fishbowl.reset_style()
+
+
+def test_scoped_style_is_local():
+    fishbowl.reset_style()
+    with fishbowl.scoped_style(font='Arbitrary'):
+        assert matplotlib.rcParams['axes.spines.left'] == original
+        assert fishbowl.get_style()['axes.spines.left'] == updated
+        fig, ax = fishbowl.core.subplots()
+        assert ax.spines['left'].get_visible() == updated
+    assert matplotlib.rcParams['axes.spines.left'] == original
+
+
+def test_scoped_style_threads():
+    import threading
+    import matplotlib.pyplot as plt
+
+    expected = {'goldfish': '#6fa29f', 'gourami': '#37a5be'}
+    colors = []
+
+    def render(palette):
+        with fishbowl.scoped_style(palette=palette, font='Arbitrary'):
+            fig, ax = fishbowl.core.subplots()
+            line, = ax.plot([0, 1], [0, 1])
+            plt.close(fig)
+        colors.append((palette, line.get_color()))
+
+    threads = [threading.Thread(target=render, args=(palette,))
+               for palette in list(expected) * 20]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(colors) == 40
+    for palette, color in colors:
+        assert color == expected[palette]
+
+
+def test_rc_context_covers_render():
+    import threading
+    import matplotlib.pyplot as plt
+
+    fishbowl.reset_style()
+    with fishbowl.scoped_style(font='Arbitrary'):
+        with fishbowl.core.rc_context():
+            fig, ax = plt.subplots()
+            line, = ax.plot([0, 1])
+            scoped = matplotlib.rcParams['lines.linewidth']
+            # Threads without a scoped style wait instead of seeing it
+            seen = []
+            thread = threading.Thread(target=lambda: seen.append(
+                fishbowl.core._rc_lock.acquire(timeout=0.1)))
+            thread.start()
+            thread.join()
+            assert seen == [False]
+    assert line.get_linewidth() == scoped
+    plt.close(fig)
+
+
+def test_rc_context_keeps_global_changes():
+    fishbowl.reset_style()
+    fishbowl.set_style(palette='gourami', font='Arbitrary')
+    with fishbowl.scoped_style(palette='goldfish', font='Arbitrary'):
+        with fishbowl.core.rc_context():
+            # The global style set while a scoped render is running
+            fishbowl.reset_style()
+    for key in ('lines.linewidth', 'axes.prop_cycle', 'axes.spines.left'):
+        assert matplotlib.rcParams[key] == fishbowl.get_style()[key]
+    fishbowl.reset_style()
+
+
+def test_context_restores_on_error():
+    fishbowl.reset_style()
+    try:
+        with fishbowl.style(font='Arbitrary'):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert matplotlib.rcParams['axes.spines.left'] == original
+
+
+def test_rasterize_option():
+    fishbowl.set_style(font='Arbitrary', rasterize=100)
+    assert fishbowl.get_style()['fishbowl.rasterize'] == 100
+    assert 'fishbowl.rasterize' not in matplotlib.rcParams
+    with fishbowl.style(font='Arbitrary'):
+        assert fishbowl.get_style()['fishbowl.rasterize'] is None
+    assert fishbowl.get_style()['fishbowl.rasterize'] == 100
+    fishbowl.reset_style()
+
+
+def test_style_stack():
+    fishbowl.reset_style()
+    fishbowl.set_style(palette='gourami', font='Arbitrary')
+    before = fishbowl.get_style()
+    depth = fishbowl.push_style(palette='goldfish', font='Arbitrary')
+    # Only the options which differ are recorded
+    assert 'axes.spines.left' not in fishbowl.core._stack.get()[-1]
+    assert 'axes.prop_cycle' in fishbowl.core._stack.get()[-1]
+    fishbowl.push_style(axes='minimal', palette='gourami', font='Other',
+                        rasterize=10)
+    matplotlib.rcParams['lines.linewidth'] = 7
+    fishbowl.pop_style(depth)
+    assert fishbowl.core._stack.get() == ()
+    assert matplotlib.rcParams['lines.linewidth'] == 7
+    matplotlib.rcParams['lines.linewidth'] = before['lines.linewidth']
+    assert fishbowl.get_style() == before
+
+    # Other threads can not pop the layers of this one
+    import threading
+    errors = []
+
+    def pop():
+        try:
+            fishbowl.pop_style()
+        except IndexError as error:
+            errors.append(error)
+    fishbowl.push_style(palette='goldfish', font='Arbitrary')
+    thread = threading.Thread(target=pop)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
+    assert len(fishbowl.core._stack.get()) == 1
+    fishbowl.pop_style()
+    fishbowl.reset_style()
+
+
+def test_style_stack_overlapping_threads():
+    import contextvars
+
+    fishbowl.reset_style()
+    before = fishbowl.get_style()
+    first, second = contextvars.copy_context(), contextvars.copy_context()
+    first.run(fishbowl.push_style, palette='goldfish', font='Arbitrary')
+    second.run(fishbowl.push_style, palette='gourami', font='Arbitrary')
+    first.run(fishbowl.pop_style)
+    # The later style is still in place until it is popped
+    assert fishbowl.get_style()['axes.prop_cycle'] == \
+        fishbowl.compile_style(palette='gourami', font='Arbitrary')[
+            'axes.prop_cycle']
+    second.run(fishbowl.pop_style)
+    assert fishbowl.get_style() == before
+    assert matplotlib.rcParams['axes.prop_cycle'] == before['axes.prop_cycle']
+    assert fishbowl.core._layers == []